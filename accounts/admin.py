@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User,UserProfile
+from .models import OutboxEmail, User, UserProfile
 
 
 # Register your models here.
@@ -16,3 +16,10 @@ class CustomUserAdmin(UserAdmin):
 admin.site.register(User,CustomUserAdmin)
 
 admin.site.register(UserProfile)
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
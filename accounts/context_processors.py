@@ -1,19 +1,22 @@
-from vendor.models import Vendor
+from django.utils.functional import SimpleLazyObject
+
+from orders.request_object import get_request_vendor
 from .models import UserProfile
 
+
+# The objects below are only fetched when a template dereferences them, at most once per request
+
 def get_vendor(request):
-    try:
-        vendor = Vendor.objects.get(user=request.user)
-    except:
-        vendor = None
-    return dict(vendor=vendor)
+    return dict(vendor=SimpleLazyObject(lambda: get_request_vendor(request)))
 
 
+def get_request_user_profile(request):
+    """The UserProfile of ``request.user``, fetched once per request (None when logged out)."""
+    if not hasattr(request, '_user_profile'):
+        user = request.user
+        request._user_profile = UserProfile.objects.filter(user=user).first() if user.is_authenticated else None
+    return request._user_profile
 
-def get_user_profile(request):
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-    except:
-        user_profile = None
-    return dict(user_profile=user_profile)
 
+def get_user_profile(request):
+    return dict(user_profile=SimpleLazyObject(lambda: get_request_user_profile(request)))
@@ -0,0 +1,87 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.template.defaultfilters import slugify
+
+from vendor.models import Vendor
+
+from .models import User, UserProfile
+from .outbox import queue_emails
+from .utils import render_verification_email
+
+
+IMPORT_ROLES = {'customer': User.CUSTOMER, 'vendor': User.VENDOR}
+REQUIRED_COLUMNS = ('email', 'first_name', 'last_name')
+USER_COLUMNS = ('first_name', 'last_name', 'phone_number')
+PROFILE_COLUMNS = ('address', 'country', 'state', 'city', 'pin_code')
+IMPORT_MAIL_SUBJECT = 'Activate Your Account'
+IMPORT_MAIL_TEMPLATE = 'accounts/emails/account_import_email.html'
+
+
+def _too_long(model, row, columns):
+    for column in columns:
+        max_length = model._meta.get_field(column).max_length
+        if len(row.get(column) or '') > max_length:
+            return '%s is longer than %d characters' % (column, max_length)
+
+
+def clean_import_row(row):
+    """``(row, None)`` with the CSV row normalized, or ``(None, error message)``."""
+    row = {key: (value or '').strip() for key, value in row.items() if key}
+    for column in REQUIRED_COLUMNS:
+        if not row.get(column):
+            return None, 'missing %s' % column
+    row['email'] = User.objects.normalize_email(row['email'])
+    try:
+        validate_email(row['email'])
+    except ValidationError:
+        return None, 'invalid email %r' % row['email']
+    role = (row.get('role') or 'customer').lower()
+    if role not in IMPORT_ROLES:
+        return None, 'unknown role %r, expected customer or vendor' % role
+    row['role'] = IMPORT_ROLES[role]
+    if row['role'] == User.VENDOR and not row.get('shop_name'):
+        return None, 'missing shop_name for a vendor'
+    error = (_too_long(User, row, ('email',) + USER_COLUMNS) or _too_long(UserProfile, row, PROFILE_COLUMNS)
+             or _too_long(Vendor, row, ('shop_name',)))
+    if error:
+        return None, error
+    return row, None
+
+
+def import_user_rows(rows, domain):
+    """Create the users of cleaned ``rows`` with their profiles and shops, returns the new users.
+
+    One bulk INSERT per table, so the per-row post_save signals and
+    Vendor.save() do not run. Rows whose e-mail already exists are skipped.
+    Passwords are left unusable: every user is sent a link to confirm their
+    address and choose one, queued in the outbox with a single INSERT.
+    """
+    existing = set(User.objects.filter(email__in=[row['email'] for row in rows]).values_list('email', flat=True))
+    rows = [row for row in rows if row['email'] not in existing]
+    if not rows:
+        return []
+    with transaction.atomic():
+        users = []
+        for row in rows:
+            user = User(email=row['email'], role=row['role'], is_staff=row['role'] == User.VENDOR,
+                        **{column: row.get(column, '') for column in USER_COLUMNS})
+            user.set_unusable_password()
+            users.append(user)
+        # Primary keys are returned by the insert (SQLite >= 3.35, PostgreSQL)
+        users = User.objects.bulk_create(users)
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(user=user, **{column: row.get(column) or None for column in PROFILE_COLUMNS})
+            for user, row in zip(users, rows)
+        ])
+        Vendor.objects.bulk_create([
+            # The slug of VendorSignupForm, unique through the user id
+            Vendor(user=user, user_profile=profile, shop_name=row['shop_name'],
+                   slug='%s-%s' % (slugify(row['shop_name']), user.id))
+            for user, profile, row in zip(users, profiles, rows) if row['role'] == User.VENDOR
+        ])
+        queue_emails([
+            (IMPORT_MAIL_SUBJECT, render_verification_email(user, domain, IMPORT_MAIL_TEMPLATE), user.email)
+            for user in users
+        ])
+    return users
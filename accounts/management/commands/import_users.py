@@ -0,0 +1,57 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.imports import REQUIRED_COLUMNS, clean_import_row, import_user_rows
+
+
+class Command(BaseCommand):
+    help = ('Create customers and vendors from a CSV file with bulk inserts. Columns: email, first_name, '
+            'last_name, and optionally role (customer/vendor), shop_name, phone_number, address, country, '
+            'state, city, pin_code')
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per transaction')
+        parser.add_argument('--domain', default='localhost:8000', help='Host of the links in the activation e-mails')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created = rows = 0
+        try:
+            csv_file = open(options['csv_file'], newline='', encoding='utf-8-sig')
+        except OSError as error:
+            raise CommandError(error)
+        with csv_file:
+            reader = csv.DictReader(csv_file)
+            missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+            if missing:
+                raise CommandError('Missing columns: %s' % ', '.join(missing))
+            seen = set()
+            chunk = []
+            for line, row in enumerate(reader, start=2):
+                rows += 1
+                row, error = clean_import_row(row)
+                if error is None and row['email'] in seen:
+                    error = 'duplicate email %s' % row['email']
+                if error:
+                    self.stderr.write('Line %d: %s' % (line, error))
+                    continue
+                seen.add(row['email'])
+                chunk.append(row)
+                if len(chunk) >= options['chunk_size']:
+                    created += self.import_chunk(chunk, options['domain'])
+                    chunk = []
+            if chunk:
+                created += self.import_chunk(chunk, options['domain'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS('Created %d users, skipped %d rows in %.1fs (%d rows/s)' % (
+            created, rows - created, elapsed, created / elapsed if elapsed else created)))
+
+    def import_chunk(self, chunk, domain):
+        users = import_user_rows(chunk, domain)
+        for email in sorted({row['email'] for row in chunk} - {user.email for user in users}):
+            self.stderr.write('Skipped %s, the user already exists' % email)
+        return len(users)
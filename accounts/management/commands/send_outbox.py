@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import OutboxEmail
+from accounts.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send the queued e-mails of the outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='E-mails per batch (default: OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting once it is empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls of an empty outbox')
+        parser.add_argument('--requeue-dead', action='store_true', help='Retry the dead e-mails from scratch first')
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            requeued = OutboxEmail.objects.filter(status=OutboxEmail.DEAD).update(
+                status=OutboxEmail.PENDING, attempts=0, next_attempt_at=timezone.now())
+            self.stdout.write('Requeued %d dead e-mails' % requeued)
+
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = drain_outbox(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write('Sent %d, failed %d' % (sent, failed))
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Sent %d e-mails, %d failures' % (total_sent, total_failed)))
@@ -113,4 +113,41 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return self.user.email
-    
\ No newline at end of file
+    
+
+class OutboxEmail(models.Model):
+    """An e-mail waiting to be sent by the send_outbox worker.
+
+    Rows are written in the transaction of the change they notify about, so
+    a rolled back change sends nothing and a committed one is never lost.
+    """
+    PENDING = 1
+    SENT = 2
+    DEAD = 3
+
+    STATUS_CHOICE = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField()
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICE, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    # worker holding the row until next_attempt_at, see accounts.outbox.claim_batch
+    claimed_by = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return self.subject
@@ -0,0 +1,97 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+def outbox_email(subject, body, to, from_email=None):
+    if isinstance(to, str):
+        to = [to]
+    return OutboxEmail(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        next_attempt_at=timezone.now(),
+    )
+
+
+def queue_email(subject, body, to, from_email=None):
+    """Add an e-mail to the outbox, in the caller's transaction."""
+    email = outbox_email(subject, body, to, from_email)
+    email.save()
+    return email
+
+
+def queue_emails(messages, from_email=None):
+    """Add ``(subject, body, to)`` e-mails to the outbox with a single INSERT."""
+    return OutboxEmail.objects.bulk_create(
+        [outbox_email(subject, body, to, from_email) for subject, body, to in messages])
+
+
+def retry_delay(attempts):
+    # Exponential backoff: OUTBOX_RETRY_DELAY, then twice as long after every failure
+    return timedelta(seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size):
+    """Due e-mails reserved for this worker until their lease expires.
+
+    The lease is pushed into next_attempt_at, so a crashed worker's rows are
+    picked up again later and concurrent workers never claim the same row.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = (OutboxEmail.objects.filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+           .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    OutboxEmail.objects.filter(id__in=list(due), status=OutboxEmail.PENDING, next_attempt_at__lte=now).update(
+        claimed_by=token, next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE))
+    return list(OutboxEmail.objects.filter(claimed_by=token).order_by('id'))
+
+
+def drain_outbox(batch_size=None):
+    """Send one batch of due e-mails over a single connection.
+
+    Returns ``(sent, failed)``. Failed e-mails are retried with backoff and
+    marked dead after OUTBOX_MAX_ATTEMPTS attempts.
+    """
+    emails = claim_batch(batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+    sent, failed = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        failed = [(email, error) for email in emails]
+    else:
+        try:
+            for email in emails:
+                message = EmailMessage(email.subject, email.body, email.from_email, to=email.to,
+                                       connection=connection)
+                try:
+                    message.send()
+                except Exception as error:
+                    failed.append((email, error))
+                else:
+                    sent.append(email.id)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    if sent:
+        OutboxEmail.objects.filter(id__in=sent).update(status=OutboxEmail.SENT, sent_at=now, claimed_by='')
+    for email, error in failed:
+        email.attempts += 1
+        email.last_error = '%s: %s' % (type(error).__name__, error)
+        email.claimed_by = ''
+        if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            email.status = OutboxEmail.DEAD
+        else:
+            email.next_attempt_at = now + retry_delay(email.attempts)
+        email.save(update_fields=['attempts', 'last_error', 'claimed_by', 'status', 'next_attempt_at'])
+    return len(sent), len(failed)
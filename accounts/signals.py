@@ -1,20 +1,11 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import User, UserProfile
 
 
 @receiver(post_save, sender=User)
-def post_save_create_profile_receiver(sender, instance, created, **kwargs):
-    print(created)
-    if created:
+def post_save_create_profile_receiver(sender, instance, created, raw=False, **kwargs):
+    # Only new users get a profile, other saves (last_login on every login, activation)
+    # cost no extra queries. Users without one get it on demand in cprofile and checkout.
+    if created and not raw:
         UserProfile.objects.create(user=instance)
-        # print("User profile Created")
-    else:
-        try:
-            profile = UserProfile.objects.get(user=instance)
-            profile.save()
-        except:
-            # Create the userprofile if not exist
-            UserProfile.objects.create(user=instance)
-            # print("Didn't Exist. User profile Created")
-        # print("user Updated")
\ No newline at end of file
@@ -1,4 +1,9 @@
+import os
+import re
+import tempfile
+from io import StringIO
 from django.core import mail
+from django.core.management import call_command
 from django.http import HttpRequest
 from django.test import TestCase
 from django.urls import reverse
@@ -8,6 +13,20 @@ from django.contrib.messages import get_messages
 from django.conf import settings
 from vendor.models import Vendor as V
 from django.template.defaultfilters import slugify
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.contrib.auth.tokens import default_token_generator
+from datetime import timedelta
+from accounts.models import OutboxEmail
+from accounts.outbox import drain_outbox, queue_email
+from accounts.throttling import throttle_stats
+from django.core.cache import cache
+from unittest.mock import patch
 
 
 # Create your tests here.
@@ -32,6 +51,8 @@ class ForgotPasswordTest(TestCase):
         response = self.client.post(reverse('forgot_password'), {
                                     'email': 'Dummy@test.com'})
         self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        drain_outbox()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, 'Reset Your Password')
 
@@ -318,3 +339,224 @@ class LogInTest(TestCase):
         # Check response code
         response = self.client.get('/admin/')
         self.assertEquals(response.status_code, 302)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('SMTP is down')
+
+
+class OutboxTest(TestCase):
+    def test_drain_sends_batches_over_one_connection(self):
+        for i in range(3):
+            queue_email('Subject %s' % i, 'Body', 'Dummy@test.com')
+        self.assertEqual(drain_outbox(batch_size=2), (2, 0))
+        self.assertEqual(drain_outbox(batch_size=2), (1, 0))
+        self.assertEqual(drain_outbox(), (0, 0))
+        self.assertEqual([message.subject for message in mail.outbox], ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.SENT).count(), 3)
+
+    def test_rolled_back_change_queues_nothing(self):
+        with transaction.atomic():
+            queue_email('Subject', 'Body', 'Dummy@test.com')
+            transaction.set_rollback(True)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    @override_settings(EMAIL_BACKEND='accounts.tests.FailingEmailBackend', OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_DELAY=60)
+    def test_failures_back_off_then_go_dead(self):
+        email = queue_email('Subject', 'Body', 'Dummy@test.com')
+        self.assertEqual(drain_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 1))
+        self.assertIn('SMTP is down', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        # not due yet
+        self.assertEqual(drain_outbox(), (0, 0))
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.DEAD, 2))
+
+
+class LazyContextProcessorTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='Dummy@test.com', password='abc@test', first_name='Dummy', last_name='Dummy')
+        self.user.is_active = True
+        self.user.role = User.CUSTOMER
+        self.user.save()
+
+    def test_anonymous_login_page_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('login'))
+        self.assertEqual(response.status_code, 200)
+        # Dereferencing the lazy values still works, and only then reads the database
+        self.assertFalse(response.context['vendor'])
+        self.assertEqual(response.context['cart_count'], 0)
+
+    def test_profile_and_vendor_are_fetched_only_when_used(self):
+        self.client.login(email='Dummy@test.com', password='abc@test')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('custDashboard'))
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('accounts_userprofile', tables)
+        self.assertNotIn('vendor_vendor', tables)
+        profile = UserProfile.objects.get(user=self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(response.context['user_profile'].pk, profile.pk)
+            self.assertEqual(response.context['user_profile'].user_id, self.user.id)
+
+
+class ProfileSignalTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='Dummy@test.com', password='abc@test', first_name='Dummy', last_name='Dummy')
+
+    def profile_queries(self, queries):
+        return [query['sql'] for query in queries if 'accounts_userprofile' in query['sql']]
+
+    def test_profile_is_created_with_the_user_only(self):
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+        # an unrelated save is a single UPDATE of the user
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_name'])
+
+    def test_login_and_activation_do_not_touch_the_profile(self):
+        uid = urlsafe_base64_encode(force_bytes(self.user.pk))
+        token = default_token_generator.make_token(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('activate', args=[uid, token]))
+        self.assertEqual(self.profile_queries(queries), [])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('login'), {'email': 'Dummy@test.com', 'password': 'abc@test'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(self.profile_queries(queries), [])
+
+    def test_missing_profile_is_created_on_demand(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        self.user.is_active = True
+        self.user.role = User.CUSTOMER
+        self.user.save()
+        self.assertFalse(UserProfile.objects.filter(user=self.user).exists())
+        self.client.login(email='Dummy@test.com', password='abc@test')
+        response = self.client.get(reverse('cprofile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+
+@override_settings(THROTTLE_RATES={
+    'login': {'ip': (5, 60), 'email': (2, 60)},
+    'forgot_password': {'ip': (10, 600), 'email': (1, 600)},
+    'reset_password': {'ip': (10, 600), 'user': (5, 600)},
+})
+class ThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='Dummy@test.com', password='abc@test', first_name='Dummy', last_name='Dummy')
+        self.user.is_active = True
+        self.user.save()
+
+    def login(self, email, **extra):
+        return self.client.post(reverse('login'), {'email': email, 'password': 'wrong'}, **extra)
+
+    def test_login_is_limited_per_email_before_hashing(self):
+        self.assertEqual(self.login('Dummy@test.com').status_code, 302)
+        self.assertEqual(self.login('dummy@TEST.com').status_code, 302)
+        with patch('accounts.views.auth.authenticate') as authenticate:
+            response = self.login('Dummy@test.com')
+        authenticate.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        # another account from the same client still has tokens
+        self.assertEqual(self.login('Other@test.com').status_code, 302)
+
+    def test_login_is_limited_per_ip(self):
+        for i in range(5):
+            self.assertEqual(self.login('user%s@test.com' % i).status_code, 302)
+        self.assertEqual(self.login('user5@test.com').status_code, 429)
+        self.assertEqual(self.login('user5@test.com', REMOTE_ADDR='10.0.0.2').status_code, 302)
+
+    def test_tokens_refill_over_time(self):
+        with patch('accounts.throttling.time.time', return_value=1000.0):
+            self.login('Dummy@test.com')
+            self.login('Dummy@test.com')
+            self.assertEqual(self.login('Dummy@test.com').status_code, 429)
+        with patch('accounts.throttling.time.time', return_value=1030.0):
+            self.assertEqual(self.login('Dummy@test.com').status_code, 302)
+            self.assertEqual(self.login('Dummy@test.com').status_code, 429)
+
+    def test_forgot_password_queues_one_mail_per_window_and_counts(self):
+        for i in range(3):
+            self.client.post(reverse('forgot_password'), {'email': 'Dummy@test.com'})
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+        stats = throttle_stats()
+        self.assertEqual(stats['forgot_password'], {'allowed': 1, 'rejected': 2})
+        self.assertEqual(stats['login'], {'allowed': 0, 'rejected': 0})
+
+        admin = User.objects.create_superuser(email='admin@test.com', password='abc@test', first_name='A', last_name='A')
+        admin.role = User.ADMIN
+        admin.save()
+        self.client.login(email='admin@test.com', password='abc@test')
+        response = self.client.get(reverse('admin_throttle_stats'))
+        self.assertEqual(response.json()['forgot_password']['rejected'], 2)
+
+
+class ImportUsersTest(TestCase):
+    header = 'email,first_name,last_name,role,shop_name,city,pin_code\n'
+
+    def import_csv(self, text, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv_file:
+            csv_file.write(self.header + text)
+        self.addCleanup(os.remove, csv_file.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_users', csv_file.name, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_users_profiles_and_shops_in_bulk(self):
+        rows = ''.join('vendor%s@test.com,Vendor,%s,vendor,Shop %s,pune,443302\n' % (i, i, i) for i in range(30))
+        rows += ''.join('customer%s@test.com,Customer,%s,,,,\n' % (i, i) for i in range(30))
+        with CaptureQueriesContext(connection) as queries:
+            out, err = self.import_csv(rows, '--chunk-size', '25')
+        self.assertIn('Created 60 users, skipped 0 rows', out)
+        self.assertEqual(err, '')
+        # 3 chunks of one lookup and at most four inserts, plus their transactions
+        self.assertLessEqual(len(queries), 3 * 7)
+
+        self.assertEqual(User.objects.filter(role=User.VENDOR, is_active=False).count(), 30)
+        self.assertEqual(UserProfile.objects.count(), 60)
+        vendor = V.objects.select_related('user', 'user_profile').get(shop_name='Shop 7')
+        self.assertEqual(vendor.slug, 'shop-7-%s' % vendor.user.id)
+        self.assertEqual(vendor.user_profile.city, 'pune')
+        self.assertFalse(vendor.user.has_usable_password())
+        self.assertEqual(OutboxEmail.objects.count(), 60)
+
+    def test_link_of_the_queued_mail_lets_the_user_set_a_password(self):
+        self.import_csv('new@test.com,New,User,,,,\n', '--domain', 'testserver')
+        body = OutboxEmail.objects.get(to=['new@test.com']).body
+        link = re.search(r'http://testserver(\S+)', body).group(1)
+        response = self.client.get(link)
+        self.assertRedirects(response, reverse('reset_password'), fetch_redirect_response=False)
+        self.client.post(reverse('reset_password'), {'password': 'abc@test', 'confirm_password': 'abc@test'})
+        self.assertTrue(self.client.login(email='new@test.com', password='abc@test'))
+
+    def test_invalid_duplicate_and_existing_rows_are_skipped(self):
+        User.objects.create_user(email='taken@test.com', password='abc@test', first_name='T', last_name='T')
+        out, err = self.import_csv(
+            'ok@test.com,Ok,Ok,,,,\n'
+            'ok@test.com,Again,Again,,,,\n'
+            'not-an-email,Bad,Bad,,,,\n'
+            'shop@test.com,No,Shop,vendor,,,\n'
+            'taken@test.com,Taken,Taken,,,,\n'
+            'admin@test.com,Admin,Admin,admin,,,\n')
+        self.assertIn('Created 1 users, skipped 5 rows', out)
+        self.assertIn('Line 3: duplicate email ok@test.com', err)
+        self.assertIn('Line 4: invalid email', err)
+        self.assertIn('Line 5: missing shop_name', err)
+        self.assertIn('Skipped taken@test.com', err)
+        self.assertIn('Line 7: unknown role', err)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
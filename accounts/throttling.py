@@ -0,0 +1,77 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+THROTTLE_PREFIX = 'throttle:'
+STATS_PREFIX = 'throttle_stats:'
+
+
+def take_token(key, capacity, period):
+    """Spend a token of the bucket ``key``, refilled at ``capacity`` tokens per ``period`` seconds.
+
+    Returns 0 when a token was spent, else the seconds until the next one. The
+    read-modify-write is not atomic, concurrent requests may share a token,
+    which only loosens the limit by the number of workers.
+    """
+    now = time.time()
+    rate = capacity / period
+    tokens, updated = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens < 1:
+        cache.set(key, (tokens, now), period)
+        return (1 - tokens) / rate
+    # A bucket left alone for ``period`` is full again, it does not need to be kept longer
+    cache.set(key, (tokens - 1, now), period)
+    return 0
+
+
+def _count(scope, outcome):
+    key = '%s%s:%s' % (STATS_PREFIX, scope, outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def throttle(request, scope, **idents):
+    """A 429 response if one of the ``scope`` buckets of this request is empty, else None.
+
+    Every request has a bucket for its client IP, ``idents`` add more (e.g.
+    ``email=...``) when THROTTLE_RATES[scope] has a rate for them. Call it
+    before the expensive work, password hashing or sending mail.
+    """
+    rates = settings.THROTTLE_RATES[scope]
+    idents = {'ip': request.META.get('REMOTE_ADDR', ''), **idents}
+    for kind, ident in idents.items():
+        if kind not in rates or not ident:
+            continue
+        capacity, period = rates[kind]
+        # Hashed, the identifiers come from the client and may not be valid cache keys
+        digest = hashlib.sha256(str(ident).lower().encode()).hexdigest()
+        wait = take_token('%s%s:%s:%s' % (THROTTLE_PREFIX, scope, kind, digest), capacity, period)
+        if wait:
+            _count(scope, 'rejected')
+            retry_after = math.ceil(wait)
+            response = HttpResponse('Too many attempts, try again in %d seconds.' % retry_after,
+                                    status=429, content_type='text/plain')
+            response['Retry-After'] = str(retry_after)
+            return response
+    _count(scope, 'allowed')
+    return None
+
+
+def throttle_stats():
+    """{scope: {'allowed', 'rejected'}} since the cache was last cleared."""
+    return {
+        scope: {
+            outcome: cache.get('%s%s:%s' % (STATS_PREFIX, scope, outcome), 0)
+            for outcome in ('allowed', 'rejected')
+        }
+        for scope in sorted(settings.THROTTLE_RATES)
+    }
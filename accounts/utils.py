@@ -4,9 +4,10 @@ from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import EmailMessage
 from django.conf import settings
 
+from .outbox import queue_email
+
 def detectUser(user):
     if user.role == 1:
         redirecturl = 'vendorDashboard'
@@ -21,18 +22,23 @@ def detectUser(user):
         redirecturl = '/admin'
         return redirecturl 
 
-def send_verification_email(request, user,mail_subject,email_template):
-    from_email = settings.DEFAULT_FROM_EMAIL
-    current_site = get_current_site(request)
-    message = render_to_string(email_template, {
+def render_verification_email(user, domain, email_template):
+    # Body of a mail with a uid/token link for ``user``, like the activation and password reset ones
+    return render_to_string(email_template, {
         'user': user,
-        'domain': current_site,
+        'domain': domain,
         'uid': urlsafe_base64_encode(force_bytes(user.pk)),
         'token': default_token_generator.make_token(user),
     })
+
+
+def send_verification_email(request, user,mail_subject,email_template):
+    from_email = settings.DEFAULT_FROM_EMAIL
+    current_site = get_current_site(request)
+    message = render_verification_email(user, current_site, email_template)
     to_email = user.email
-    mail = EmailMessage(mail_subject, message, from_email, to=[to_email])
-    mail.send()
+    # Sent later by the send_outbox worker, not during the request
+    queue_email(mail_subject, message, [to_email], from_email)
     
     
 def send_notification(mail_subject, mail_template, context):
@@ -43,6 +49,4 @@ def send_notification(mail_subject, mail_template, context):
         to_email.append(context['to_email'])
     else:
         to_email = context['to_email']
-    mail = EmailMessage(mail_subject, message, from_email, to=to_email)
-    #mail.content_subtype = "html"
-    mail.send()
\ No newline at end of file
+    queue_email(mail_subject, message, to_email, from_email)
\ No newline at end of file
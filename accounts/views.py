@@ -4,14 +4,19 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.exceptions import PermissionDenied
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import default_token_generator
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from allauth.account.views import SignupView
-import datetime
+from decimal import Decimal
 
-from orders.models import Order
-from products.models import Product
-from vendor.models import Vendor
+from ecart.pagination import keyset_paginate
+from orders.models import Order, VendorDailyRevenue, VendorOrder
+from orders.request_object import get_request_vendor
+from superadmin.models import PlatformStats
 
 from .models import User
+from .throttling import throttle
 from .forms import UserSignupForm, VendorSignupForm
 from accounts.utils import detectUser, send_verification_email
 
@@ -91,7 +96,7 @@ def activate(request, uidb64, token):
 
     if user is not None and default_token_generator.check_token(user, token):
         user.is_active = True
-        user.save()
+        user.save(update_fields=['is_active'])
         messages.success(request, 'Congratulation! Your account is activated.')
         return redirect('myAccount')
     else:
@@ -107,6 +112,9 @@ def login(request):
         email = request.POST['email']
         password = request.POST['password']
 
+        limited = throttle(request, 'login', email=email)
+        if limited is not None:
+            return limited
         user = auth.authenticate(email=email, password=password)
 
         if user is not None:
@@ -139,9 +147,9 @@ def myAccount(request):
 @user_passes_test(check_role_customer)
 def custDashboard(request):
     orders = Order.objects.filter(user=request.user, is_ordered=True)
-    recent_orders = orders[:5]
+    # the first keyset page, the full history is paginated by customers.views.my_orders
+    recent_orders = keyset_paginate(orders, per_page=5).items
     context = {
-        'orders': orders,
         'orders_count': orders.count(),
         'recent_orders': recent_orders,
     }
@@ -152,29 +160,22 @@ def custDashboard(request):
 @user_passes_test(check_role_vendor)
 def vendorDashboard(request):
 
-    vendor = Vendor.objects.get(user=request.user)
-    orders = Order.objects.filter(
-        vendors__in=[vendor.id], is_ordered=True).order_by('created_at')
-    recent_orders = orders[:10]
-
-    # current month's revenue
-    current_month = datetime.datetime.now().month
-    current_month_orders = orders.filter(
-        vendors__in=[vendor.id], created_at__month=current_month)
-    current_month_revenue = 0
-    for i in current_month_orders:
-        current_month_revenue += i.get_total_by_vendor()['grand_total']
-
-    # total revenue
-    total_revenue = 0
-    for i in orders:
-        total_revenue += i.get_total_by_vendor()['grand_total']
+    vendor = get_request_vendor(request)
+    recent_orders = VendorOrder.objects.filter(
+        vendor=vendor, order__is_ordered=True).select_related('order').order_by('-created_at', '-id')[:10]
+
+    # revenue from the daily rollups, the month starts at midnight in TIME_ZONE
+    month_start = timezone.localdate().replace(day=1)
+    totals = VendorDailyRevenue.objects.filter(vendor=vendor).aggregate(
+        orders_count=Coalesce(Sum('orders_count'), 0),
+        total_revenue=Coalesce(Sum('revenue'), Value(Decimal('0'))),
+        current_month_revenue=Coalesce(Sum('revenue', filter=Q(date__gte=month_start)), Value(Decimal('0'))),
+    )
     context = {
-        'orders': orders,
-        'orders_count': orders.count(),
+        'orders_count': totals['orders_count'],
         'recent_orders': recent_orders,
-        'total_revenue': total_revenue,
-        'current_month_revenue': current_month_revenue,
+        'total_revenue': totals['total_revenue'],
+        'current_month_revenue': totals['current_month_revenue'],
     }
     return render(request, 'accounts/vendorDashboard.html', context)
 
@@ -183,6 +184,9 @@ def forgot_password(request):
     if request.method == 'POST':
         email = request.POST['email']
 
+        limited = throttle(request, 'forgot_password', email=email)
+        if limited is not None:
+            return limited
         if User.objects.filter(email=email).exists():
             user = User.objects.get(email__exact=email)
 
@@ -223,6 +227,9 @@ def reset_password(request):
         password = request.POST['password']
         confirm_password = request.POST['confirm_password']
 
+        limited = throttle(request, 'reset_password', user=request.session.get('uid'))
+        if limited is not None:
+            return limited
         if password == confirm_password:
             pk = request.session.get('uid')
             user = User.objects.get(pk=pk)
@@ -240,16 +247,15 @@ def reset_password(request):
 @login_required(login_url='login')
 @user_passes_test(check_role_admin)
 def adminDashboard(request):
-    totalOrders = Order.objects.filter(is_ordered=True)
-    totalCustomers = User.objects.filter(role=2, is_active=True)
-    totalVendors = Vendor.objects.filter(is_approved=True)
-    totalProducts = Product.objects.filter(is_available=True)
+    # precomputed counters, recounted every PLATFORM_STATS_MAX_AGE seconds or on demand
+    stats = PlatformStats.objects.snapshot()
 
     context = {
-        'totalOrders': totalOrders.count(),
-        'totalCustomers': totalCustomers.count(),
-        'totalVendors': totalVendors.count(),
-        'totalProducts': totalProducts.count(),
+        'totalOrders': stats.orders,
+        'totalCustomers': stats.customers,
+        'totalVendors': stats.vendors,
+        'totalProducts': stats.products,
+        'stats_refreshed_at': stats.refreshed_at,
     }
 
     return render(request, 'superadmin/adminDashboard.html', context)
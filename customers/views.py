@@ -1,8 +1,11 @@
-from django.shortcuts import get_object_or_404, redirect, render
+from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 from accounts.forms import UserInfoForm, UserProfileForm
 from accounts.models import UserProfile
 from django.contrib import messages
+from django.conf import settings
+
+from ecart.pagination import keyset_paginate
 
 
 from orders.models import Order, OrderedProduct
@@ -11,7 +14,7 @@ import simplejson as json
 
 @login_required(login_url='login')
 def cprofile(request):
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
     if request.method == 'POST':
         profile_form = UserProfileForm(
             request.POST, request.FILES, instance=profile)
@@ -37,11 +40,12 @@ def cprofile(request):
 
 
 def my_orders(request):
-    orders = Order.objects.filter(
-        user=request.user, is_ordered=True).order_by('-created_at')
+    orders = Order.objects.filter(user=request.user, is_ordered=True)
+    page = keyset_paginate(orders, request.GET.get('cursor'), settings.ORDER_HISTORY_PAGE_SIZE)
 
     context = {
-        'orders': orders,
+        'orders': page.items,
+        'page': page,
     }
     return render(request, 'customers/my_orders.html', context)
 
@@ -0,0 +1,134 @@
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+TAG_PREFIX = 'tag:'
+STATS_PREFIX = 'cache_stats:'
+# Namespaces whose hits and misses are counted, see cache_stats()
+STATS_KEYS = 'cache_stats:namespaces'
+
+_MISSING = object()
+
+
+class LockTimeout(Exception):
+    pass
+
+
+@contextmanager
+def cache_lock(key, timeout=5, wait=5, backend=cache):
+    """Hold ``key`` in ``backend`` for the block, shared by every process using that cache.
+
+    cache.add is atomic, only the first caller gets the key. The others poll
+    for up to ``wait`` seconds, then raise LockTimeout. The key expires after
+    ``timeout`` seconds so a crashed holder does not block everyone.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not backend.add(key, token, timeout):
+        if time.monotonic() >= deadline:
+            raise LockTimeout('Could not acquire %r within %s seconds' % (key, wait))
+        time.sleep(0.001)
+    try:
+        yield
+    finally:
+        # Not ours anymore if it expired and another process took it
+        if backend.get(key) == token:
+            backend.delete(key)
+
+
+def _tag_keys(tags):
+    return [TAG_PREFIX + tag for tag in tags]
+
+
+def get_tag_versions(tags):
+    """{tag: version}, tags without a version get a new one."""
+    keys = _tag_keys(tags)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # add() keeps a version set concurrently by another process
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return {key[len(TAG_PREFIX):]: versions[key] for key in keys}
+
+
+def _bump(keys):
+    cache.delete_many(keys)
+
+
+def invalidate_tags(*tags):
+    """Invalidate every entry cached with one of ``tags``.
+
+    The versions are dropped now and again once the transaction commits, so
+    an entry recomputed from not yet committed data does not survive.
+    """
+    keys = _tag_keys(tags)
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def _count(namespace, outcome):
+    key = '%s%s:%s' % (STATS_PREFIX, namespace, outcome)
+    if cache.add(key, 1, None):
+        namespaces = cache.get(STATS_KEYS, set())
+        if namespace not in namespaces:
+            cache.set(STATS_KEYS, namespaces | {namespace}, None)
+    else:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def cached(key, compute, tags=(), timeout=None, value_tags=None):
+    """``compute()``, cached under ``key`` until one of its tags is invalidated.
+
+    ``tags`` are known upfront, ``value_tags`` is an optional function of the
+    computed value returning more tags, for entries that depend on what they
+    contain. Hits and misses are counted per namespace, the part of ``key``
+    before the first ``:``.
+    """
+    namespace = key.split(':', 1)[0]
+    entry = cache.get(key, _MISSING)
+    if entry is not _MISSING:
+        value, versions = entry
+        if get_tag_versions(versions) == versions:
+            _count(namespace, 'hits')
+            return value
+    _count(namespace, 'misses')
+
+    # Read before computing, so an invalidation of ``tags`` during compute()
+    # leaves the entry with an old version and the next read recomputes it
+    versions = get_tag_versions(tags)
+    value = compute()
+    if value_tags is not None:
+        # These can only be read after computing: an invalidation of one of
+        # them during compute() is missed, unless it also invalidates a tag of ``tags``
+        versions.update(get_tag_versions([tag for tag in value_tags(value) if tag not in versions]))
+    cache.set(key, (value, versions), timeout)
+    return value
+
+
+def cache_stats():
+    """{namespace: {'hits', 'misses', 'hit_rate'}} since the cache was last cleared."""
+    stats = {}
+    for namespace in sorted(cache.get(STATS_KEYS, set())):
+        hits = cache.get('%s%s:hits' % (STATS_PREFIX, namespace), 0)
+        misses = cache.get('%s%s:misses' % (STATS_PREFIX, namespace), 0)
+        total = hits + misses
+        stats[namespace] = {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0}
+    return stats
+
+
+def reset_cache_stats():
+    namespaces = cache.get(STATS_KEYS, set())
+    cache.delete_many(['%s%s:%s' % (STATS_PREFIX, namespace, outcome)
+                       for namespace in namespaces for outcome in ('hits', 'misses')] + [STATS_KEYS])
+
+
+def product_tags(product):
+    return ['product:%s' % product.pk, 'category:%s' % product.category_id, 'vendor:%s' % product.vendor_id]
@@ -0,0 +1,84 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+# Largest value of a 64-bit signed primary key column
+MAX_PK = 2 ** 63 - 1
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(direction, value, pk):
+    payload = json.dumps([direction, value.isoformat(), pk])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # Returns (direction, value, pk), or (None, None, None) for a missing or tampered cursor
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = parse_datetime(value)
+        # bool is an int subclass, and larger ints overflow the database integer
+        if (direction in ('next', 'prev') and value is not None and timezone.is_aware(value)
+                and type(pk) is int and 1 <= pk <= MAX_PK):
+            return direction, value, pk
+    except (TypeError, ValueError, AttributeError):
+        pass
+    return None, None, None
+
+
+def keyset_paginate(queryset, cursor=None, per_page=20, field='created_at'):
+    """One page of ``queryset`` newest first, ordered on ``(field, pk)``.
+
+    Unlike OFFSET pagination the cost of a page does not depend on how deep
+    it is, as long as an index covers the filter followed by ``field, id``.
+    """
+    direction, value, pk = decode_cursor(cursor) if cursor else (None, None, None)
+    if direction == 'next':
+        queryset = queryset.filter(Q(**{field + '__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+    elif direction == 'prev':
+        queryset = queryset.filter(Q(**{field + '__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+
+    if direction == 'prev':
+        rows = list(queryset.order_by(field, 'pk')[:per_page + 1])
+    else:
+        rows = list(queryset.order_by('-' + field, '-pk')[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == 'prev':
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, direction == 'next'
+
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor('next', getattr(rows[-1], field), rows[-1].pk)
+    if rows and has_previous:
+        previous_cursor = encode_cursor('prev', getattr(rows[0], field), rows[0].pk)
+    return KeysetPage(rows, next_cursor, previous_cursor)
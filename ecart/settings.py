@@ -104,6 +104,48 @@ DATABASES = {
 }
 
 
+# Cache
+# Guest carts live here; point it at a shared cache (memcached, redis)
+# when running several worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecart',
+    },
+    # Guest carts exist nowhere else, so they are kept apart from the default cache,
+    # which culls entries once full. Shared between processes and culled only past
+    # MAX_ENTRIES; Redis with maxmemory-policy noeviction also works.
+    'guest_carts': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'var', 'guest_carts'),
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+# Token buckets of the views that hash passwords or send mail (accounts.throttling),
+# per scope and key: (burst, seconds to refill the whole burst). Every request is keyed by client IP.
+THROTTLE_RATES = {
+    'login': {'ip': (20, 60), 'email': (5, 60)},
+    'forgot_password': {'ip': (10, 600), 'email': (3, 600)},
+    'reset_password': {'ip': (10, 600), 'user': (5, 600)},
+}
+
+# Guest carts expire after a week without changes
+GUEST_CART_TIMEOUT = 60 * 60 * 24 * 7
+GUEST_CART_CACHE = 'guest_carts'
+
+# Storage of logged in users' carts: 'marketplace.stores.DatabaseCartStore'
+# writes every change to the Cart table, 'marketplace.stores.CachedCartStore'
+# keeps carts in the cache and writes them behind in batches. The latter needs
+# a CART_STORE_CACHE alias in CACHES shared by every process that never evicts
+# entries (not locmem), and `manage.py flush_carts` run from cron.
+CART_STORE = 'marketplace.stores.DatabaseCartStore'
+CART_STORE_CACHE = 'cart_store'
+CART_STORE_FLUSH_EVERY = 20
+CART_STORE_FLUSH_INTERVAL = 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -179,9 +221,28 @@ EMAIL_HOST_PASSWORD = "Welcome@123"
 EMAIL_USE_TLS = True
 DEFAULT_FROM_EMAIL = "E-CART <django.admin@gmail.com>"
 
+# E-mails are queued in accounts.OutboxEmail and sent by `manage.py send_outbox`
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+# seconds before the first retry, doubled after every failed attempt
+OUTBOX_RETRY_DELAY = 60
+# seconds a worker holds the e-mails it claimed
+OUTBOX_LEASE = 300
+
 MEDIA_ROOT = os.path.join(BASE_DIR,"media")
 MEDIA_URL = "/media/"
 
+# Processes rendering product thumbnails (products.images), 0 renders them in the request
+PRODUCT_IMAGE_WORKERS = 2
+
+# Orders per page of the customer, vendor and admin order histories (keyset paginated)
+ORDER_HISTORY_PAGE_SIZE = 25
+# Rows fetched per database round trip by the streaming order exports (orders.exports)
+ORDER_EXPORT_CHUNK_SIZE = 2000
+
+# Seconds the admin dashboard counters (superadmin.PlatformStats) are served before being recounted
+PLATFORM_STATS_MAX_AGE = 300
+
 DEFAULT_AUTO_FIELD='django.db.models.AutoField' 
 
 CSRF_TRUSTED_ORIGINS = ['https://ecart-ecommerce-project.herokuapp.com/']
@@ -22,11 +22,15 @@ from ecart import settings
 
 
 from marketplace import views as MarketplaceViews
+from products import views as ProductViews
 from . import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('',views.home,name='home'),
+    path('catalog/',views.home_catalog,name='home_catalog'),
+    path('search/',ProductViews.search,name='search'),
+    path('shop/',ProductViews.filter_products,name='filter_products'),
     path('account/',include('accounts.urls')),
     path('accounts/', include('allauth.urls')),
     
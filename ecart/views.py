@@ -1,12 +1,54 @@
-from multiprocessing import context
-from django.shortcuts import render, HttpResponse
+from django.shortcuts import render
+from django.views.decorators.csrf import ensure_csrf_cookie
 
 from products.models import Product
 
+from .cache import cached
+from .pagination import decode_cursor, keyset_paginate
 
+
+# Products per page of the home catalog, further pages are appended by infinite scroll
+CATALOG_PAGE_SIZE = 24
+
+
+def catalog_tags(page):
+    # Cards show the shop and category names, so renaming them invalidates the page too
+    tags = set()
+    for product in page.items:
+        tags.update(['vendor:%s' % product.vendor_id, 'category:%s' % product.category_id])
+    return sorted(tags)
+
+
+def get_catalog_page(request):
+    cursor = request.GET.get('cursor') or ''
+    if decode_cursor(cursor)[0] is None:
+        cursor = ''
+
+    def compute():
+        products = Product.objects.filter(is_available=True).select_related('vendor', 'category')
+        return keyset_paginate(products, cursor, CATALOG_PAGE_SIZE)
+    if cursor:
+        # Cursors come from the client, caching every one would let anyone fill the cache
+        return compute()
+    return cached('catalog:first', compute, ['catalog'], value_tags=catalog_tags)
+
+
+@ensure_csrf_cookie
 def home(request):
-    products = Product.objects.filter(is_available=True)
+    page = get_catalog_page(request)
+    context = {
+        'products': page.items,
+        'page': page,
+    }
+    return render(request, 'home.html', context)
+
+
+def home_catalog(request):
+    # HTML fragment with the next catalog cards, the cursor of the following page is in a header
+    page = get_catalog_page(request)
     context = {
-        'products':products,
+        'products': page.items,
     }
-    return render(request, 'home.html' , context)
+    response = render(request, 'includes/product_cards.html', context)
+    response['X-Next-Cursor'] = page.next_cursor or ''
+    return response
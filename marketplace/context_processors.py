@@ -1,31 +1,22 @@
-from .models import Cart
-from products.models import Product
+from django.utils.functional import SimpleLazyObject, new_method_proxy
 
+from .utils import get_cart_summary
+
+
+class LazyNumber(SimpleLazyObject):
+    # Templates localize numbers with format(), which SimpleLazyObject does not proxy
+    __format__ = new_method_proxy(format)
+
+
+# Lazy, so pages that do not show the cart never load it (get_cart_summary memoizes it per request)
 
 def get_cart_counter(request):
-    cart_count = 0
-    if request.user.is_authenticated:
-        try:
-            cart_items = Cart.objects.filter(user=request.user)
-            if cart_items:
-                for cart_item in cart_items:
-                    cart_count += cart_item.quantity
-            else:
-                cart_count = 0
-        except:
-            cart_count = 0
-    return dict(cart_count=cart_count)
+    return dict(cart_count=LazyNumber(lambda: get_cart_summary(request).cart_count))
 
 
 def get_cart_amounts(request):
-    subtotal = 0
-    tax = 0
-    grand_total = 0
-    if request.user.is_authenticated:
-        cart_items = Cart.objects.filter(user=request.user)
-        for item in cart_items:
-            product = Product.objects.get(pk=item.product.id)
-            subtotal += (product.price * item.quantity) # subtotal = subtotal + (fooditem.price * item.quantity)
-
-        grand_total = subtotal + tax
-    return dict(subtotal=subtotal, tax=tax, grand_total=grand_total)
\ No newline at end of file
+    return dict(
+        subtotal=LazyNumber(lambda: get_cart_summary(request).subtotal),
+        tax=LazyNumber(lambda: get_cart_summary(request).tax),
+        grand_total=LazyNumber(lambda: get_cart_summary(request).grand_total),
+    )
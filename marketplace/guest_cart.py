@@ -0,0 +1,122 @@
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import cached_property
+
+from products.models import Product
+
+from .models import Cart
+from .stores import get_cart_store
+
+
+GUEST_CART_COOKIE = 'guest_cart'
+
+
+def get_guest_cart_cache():
+    # Not the default cache, which drops entries once it is full
+    return caches[getattr(settings, 'GUEST_CART_CACHE', 'guest_carts')]
+
+
+def get_guest_cart_timeout():
+    # Seconds of inactivity after which a guest cart expires
+    return getattr(settings, 'GUEST_CART_TIMEOUT', 60 * 60 * 24 * 7)
+
+
+class GuestCart:
+    """Cart of an anonymous shopper, kept in the GUEST_CART_CACHE cache under a cookie token.
+
+    Reading and changing it never writes to the database.
+    """
+
+    def __init__(self, request):
+        token = request.COOKIES.get(GUEST_CART_COOKIE, '')
+        self.token = token if token.isalnum() else ''
+        self.modified = False
+
+    @property
+    def cache_key(self):
+        return 'guest_cart:%s' % self.token
+
+    @cached_property
+    def quantities(self):
+        if not self.token:
+            return {}
+        return get_guest_cart_cache().get(self.cache_key, {})
+
+    def get_quantity(self, product_id):
+        return self.quantities.get(product_id, 0)
+
+    def increment(self, product_id, delta=1):
+        """Returns the new quantity or None if the product does not exist."""
+        if product_id not in self.quantities and not Product.objects.filter(id=product_id).exists():
+            return None
+        self.quantities[product_id] = self.get_quantity(product_id) + delta
+        self.modified = True
+        return self.quantities[product_id]
+
+    def decrement(self, product_id, delta=1):
+        """Returns the new quantity (0 once removed) or None if the line does not exist."""
+        if product_id not in self.quantities:
+            return None
+        quantity = self.quantities[product_id] - delta
+        if quantity > 0:
+            self.quantities[product_id] = quantity
+        else:
+            del self.quantities[product_id]
+            quantity = 0
+        self.modified = True
+        return quantity
+
+    def apply(self, deltas):
+        """Apply ``{product_id: delta}`` at once, nothing changes if a product does not exist."""
+        added = [product_id for product_id, delta in deltas.items() if delta > 0 and product_id not in self.quantities]
+        if added and Product.objects.filter(id__in=added).count() != len(added):
+            return False
+        for product_id, delta in deltas.items():
+            if delta > 0:
+                self.quantities[product_id] = self.get_quantity(product_id) + delta
+                self.modified = True
+            elif delta < 0:
+                self.decrement(product_id, -delta)
+        return True
+
+    def cart_items(self):
+        """Unsaved Cart objects of the lines, to render the cart page like a user's."""
+        if not self.quantities:
+            return []
+        products = Product.objects.filter(id__in=self.quantities).select_related('vendor').in_bulk()
+        return [Cart(product=products[product_id], quantity=quantity)
+                for product_id, quantity in self.quantities.items() if product_id in products]
+
+    def clear(self):
+        if self.token:
+            get_guest_cart_cache().delete(self.cache_key)
+        self.quantities = {}
+        self.modified = False
+
+    def save(self, response):
+        # Store the changes and refresh the expiry of both the cache entry and the cookie
+        if not self.modified:
+            return
+        if not self.token:
+            self.token = secrets.token_hex(16)
+        timeout = get_guest_cart_timeout()
+        get_guest_cart_cache().set(self.cache_key, self.quantities, timeout)
+        response.set_cookie(GUEST_CART_COOKIE, self.token, max_age=timeout, httponly=True, samesite='Lax')
+        self.modified = False
+
+
+def get_guest_cart(request):
+    guest_cart = getattr(request, '_guest_cart', None)
+    if guest_cart is None:
+        guest_cart = request._guest_cart = GuestCart(request)
+    return guest_cart
+
+
+def merge_guest_cart(request, user):
+    # Move the guest cart into the user's Cart rows with one bulk upsert
+    guest_cart = get_guest_cart(request)
+    if guest_cart.quantities:
+        get_cart_store().merge(user, guest_cart.quantities)
+    guest_cart.clear()
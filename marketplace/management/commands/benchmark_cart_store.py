@@ -0,0 +1,72 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from accounts.models import User, UserProfile
+from marketplace.stores import get_cart_store
+from products.models import Category, Product
+from vendor.models import Vendor
+
+
+STORES = [
+    'marketplace.stores.DatabaseCartStore',
+    'marketplace.stores.CachedCartStore',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare cart clicks per second of the cart store backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clicks', type=int, default=2000, help='Cart changes per backend')
+        parser.add_argument('--products', type=int, default=10, help='Distinct products clicked')
+
+    def handle(self, *args, **options):
+        shopper, vendor_user, products = self.create_fixtures(options['products'])
+        try:
+            for store_path in STORES:
+                with override_settings(CART_STORE=store_path):
+                    try:
+                        store = get_cart_store()
+                    except ImproperlyConfigured as error:
+                        self.stdout.write('%s: skipped, %s' % (store_path.rsplit('.', 1)[-1], error))
+                        continue
+                    store.clear(shopper)
+                    elapsed = self.run_clicks(store, shopper, products, options['clicks'])
+                self.stdout.write('%s: %d clicks in %.2fs (%.0f clicks/sec)' % (
+                    store_path.rsplit('.', 1)[-1], options['clicks'], elapsed, options['clicks'] / elapsed))
+        finally:
+            # Deleting the users cascades to the vendor, its products and the carts
+            shopper.delete()
+            vendor_user.delete()
+
+    def run_clicks(self, store, shopper, products, clicks):
+        start = time.perf_counter()
+        for click in range(clicks):
+            product_id = products[click % len(products)]
+            # two increments for every decrement, like a shopper filling a cart
+            if click % 3 == 2:
+                store.decrement(shopper, product_id)
+            else:
+                store.increment(shopper, product_id)
+        store.flush(shopper)
+        return time.perf_counter() - start
+
+    def create_fixtures(self, product_count):
+        marker = str(int(time.time() * 1000))
+        shopper = User.objects.create_user(
+            first_name='Bench', last_name='Shopper', email='bench-shopper-%s@example.com' % marker)
+        vendor_user = User.objects.create_user(
+            first_name='Bench', last_name='Vendor', email='bench-vendor-%s@example.com' % marker)
+        vendor = Vendor.objects.create(
+            user=vendor_user, user_profile=UserProfile.objects.get(user=vendor_user),
+            shop_name='Bench', slug='bench-%s' % marker)
+        category = Category.objects.create(vendor=vendor, category_name='Bench', slug='bench-%s' % marker)
+        products = Product.objects.bulk_create([
+            Product(vendor=vendor, category=category, title='Bench %s' % i, slug='bench-%s-%s' % (marker, i),
+                    price=10, image='productimages/casual.jpeg')
+            for i in range(product_count)
+        ])
+        return shopper, vendor_user, [product.id for product in products]
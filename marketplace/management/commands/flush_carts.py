@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from marketplace.stores import get_cart_store
+
+
+class Command(BaseCommand):
+    help = 'Write behind the cached carts whose changes waited CART_STORE_FLUSH_INTERVAL seconds, run it from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Flush every cart with unflushed changes')
+
+    def handle(self, *args, **options):
+        store = get_cart_store()
+        if not hasattr(store, 'pending_users'):
+            self.stdout.write('The cart store writes every change directly, nothing to flush')
+            return
+        user_ids = store.pending_users(0 if options['all'] else store.flush_interval)
+        users = User.objects.filter(pk__in=user_ids)
+        for user in users:
+            store.flush(user)
+        self.stdout.write(self.style.SUCCESS('Flushed %d carts' % len(users)))
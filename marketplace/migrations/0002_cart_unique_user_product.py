@@ -0,0 +1,33 @@
+# Generated by Django 4.1.1 on 2026-10-18 20:34
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_cart_rows(apps, schema_editor):
+    # Fold duplicated (user, product) lines into the oldest one before adding the constraint
+    Cart = apps.get_model('marketplace', 'Cart')
+    duplicates = (Cart.objects.values('user_id', 'product_id')
+                  .annotate(rows=Count('id'), total=Sum('quantity'))
+                  .filter(rows__gt=1))
+    for duplicate in duplicates:
+        lines = Cart.objects.filter(
+            user_id=duplicate['user_id'], product_id=duplicate['product_id']).order_by('created_at', 'id')
+        keep = lines.first()
+        lines.exclude(pk=keep.pk).delete()
+        Cart.objects.filter(pk=keep.pk).update(quantity=duplicate['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_cart_user_product'),
+        ),
+    ]
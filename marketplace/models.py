@@ -1,9 +1,99 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone
 
 from accounts.models import User
 from products.models import Product
 
 
+class CartManager(models.Manager):
+    """Cart mutations done in the database, one statement per click.
+
+    The statements rely on the unique (user, product) constraint and on
+    ``ON CONFLICT`` / ``RETURNING`` (SQLite >= 3.35, PostgreSQL).
+    """
+
+    merge_batch_size = 300
+
+    def _execute(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _now(self):
+        return connection.ops.adapt_datetimefield_value(timezone.now())
+
+    def increment(self, user, product_id, delta=1):
+        """Add ``delta`` to the line, creating it if needed.
+
+        Returns the new quantity or None if the product does not exist.
+        """
+        cart_table = self.model._meta.db_table
+        product_table = Product._meta.db_table
+        now = self._now()
+        sql = (
+            f'INSERT INTO {cart_table} (user_id, product_id, quantity, created_at, updated_at) '
+            f'SELECT %s, id, %s, %s, %s FROM {product_table} WHERE id = %s '
+            f'ON CONFLICT (user_id, product_id) DO UPDATE '
+            f'SET quantity = {cart_table}.quantity + excluded.quantity, updated_at = excluded.updated_at '
+            f'RETURNING quantity'
+        )
+        return self._execute(sql, [user.pk, delta, now, now, product_id])
+
+    def decrement(self, user, product_id, delta=1):
+        """Remove ``delta`` from the line, deleting it when it reaches zero.
+
+        Returns the new quantity (0 once deleted) or None if the line does not exist.
+        """
+        cart_table = self.model._meta.db_table
+        # A concurrent increment can land between the two statements, the
+        # DELETE then matches nothing and the UPDATE is tried again
+        for attempt in range(2):
+            quantity = self._execute(
+                f'UPDATE {cart_table} SET quantity = quantity - %s, updated_at = %s '
+                f'WHERE user_id = %s AND product_id = %s AND quantity > %s RETURNING quantity',
+                [delta, self._now(), user.pk, product_id, delta])
+            if quantity is not None:
+                return quantity
+            deleted = self._execute(
+                f'DELETE FROM {cart_table} WHERE user_id = %s AND product_id = %s AND quantity <= %s RETURNING id',
+                [user.pk, product_id, delta])
+            if deleted is not None:
+                return 0
+        return None
+
+    def merge(self, user, quantities):
+        """Add ``{product_id: quantity}`` to the user's cart, one statement per ``merge_batch_size`` products.
+
+        Products that no longer exist are skipped.
+        """
+        cart_table = self.model._meta.db_table
+        product_table = Product._meta.db_table
+        now = self._now()
+        items = list(quantities.items())
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Three parameters per product, within SQLite's limit on bound variables
+            for start in range(0, len(items), self.merge_batch_size):
+                batch = items[start:start + self.merge_batch_size]
+                cases = ' '.join(['WHEN %s THEN CAST(%s AS INTEGER)'] * len(batch))
+                placeholders = ', '.join(['%s'] * len(batch))
+                params = [user.pk]
+                for product_id, quantity in batch:
+                    params += [product_id, quantity]
+                params += [now, now] + [product_id for product_id, quantity in batch]
+                cursor.execute(
+                    f'INSERT INTO {cart_table} (user_id, product_id, quantity, created_at, updated_at) '
+                    f'SELECT %s, id, CASE id {cases} END, %s, %s FROM {product_table} WHERE id IN ({placeholders}) '
+                    f'ON CONFLICT (user_id, product_id) DO UPDATE '
+                    f'SET quantity = {cart_table}.quantity + excluded.quantity, updated_at = excluded.updated_at',
+                    params)
+
+    def remove(self, user, product_id):
+        """Delete the line, returns whether it existed."""
+        deleted, _ = self.filter(user=user, product_id=product_id).delete()
+        return bool(deleted)
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -11,5 +101,12 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_user_product'),
+        ]
+
     def __unicode__(self):
-        return self.user
\ No newline at end of file
+        return self.user
@@ -0,0 +1,257 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from ecart.cache import cache_lock
+from products.models import Product
+
+from .models import Cart
+
+
+class BaseCartStore:
+    """Where the carts of logged in users are kept.
+
+    ``increment``/``decrement`` return the new quantity of the line, or None
+    when the product (respectively the line) does not exist.
+    """
+
+    def increment(self, user, product_id, delta=1):
+        raise NotImplementedError
+
+    def decrement(self, user, product_id, delta=1):
+        raise NotImplementedError
+
+    def apply(self, user, deltas):
+        """Apply ``{product_id: delta}`` atomically, returns False if a product does not exist."""
+        raise NotImplementedError
+
+    def remove_line(self, user, cart_id):
+        """Delete the Cart row ``cart_id``, returns whether it existed."""
+        raise NotImplementedError
+
+    def merge(self, user, quantities):
+        raise NotImplementedError
+
+    def lines(self, user):
+        """(product_id, quantity, price) of every line."""
+        raise NotImplementedError
+
+    def clear(self, user):
+        raise NotImplementedError
+
+    def flush(self, user):
+        """Make the Cart table reflect the cart, needed before reading Cart rows directly."""
+
+
+class DatabaseCartStore(BaseCartStore):
+    """Every change is written straight to the Cart table."""
+
+    def increment(self, user, product_id, delta=1):
+        return Cart.objects.increment(user, product_id, delta)
+
+    def decrement(self, user, product_id, delta=1):
+        return Cart.objects.decrement(user, product_id, delta)
+
+    def apply(self, user, deltas):
+        with transaction.atomic():
+            for product_id, delta in deltas.items():
+                if delta > 0:
+                    if Cart.objects.increment(user, product_id, delta) is None:
+                        transaction.set_rollback(True)
+                        return False
+                elif delta < 0:
+                    Cart.objects.decrement(user, product_id, -delta)
+        return True
+
+    def remove_line(self, user, cart_id):
+        deleted, _ = Cart.objects.filter(user=user, id=cart_id).delete()
+        return bool(deleted)
+
+    def merge(self, user, quantities):
+        Cart.objects.merge(user, quantities)
+
+    def lines(self, user):
+        return list(Cart.objects.filter(user=user).values_list('product_id', 'quantity', 'product__price'))
+
+    def clear(self, user):
+        Cart.objects.filter(user=user).delete()
+
+
+class CachedCartStore(BaseCartStore):
+    """Carts live in the cache and are written behind to the Cart table.
+
+    Changes are flushed in one batch every ``CART_STORE_FLUSH_EVERY`` changes
+    or once the oldest unflushed change is ``CART_STORE_FLUSH_INTERVAL``
+    seconds old, and whenever ``flush`` is called (cart page, checkout, orders).
+    Carts left alone are flushed by the ``flush_carts`` command, run it from
+    cron at least every ``CART_STORE_FLUSH_INTERVAL`` seconds.
+
+    The carts are kept in the ``CART_STORE_CACHE`` cache, which every process
+    must share and which must not evict entries, or unflushed changes are
+    lost: e.g. Redis with ``maxmemory-policy noeviction``, or the database
+    cache with a ``MAX_ENTRIES`` above the number of carts.
+    """
+
+    lock_timeout = 5
+    # Seconds to wait for another request changing the same cart before giving up
+    lock_wait = 5
+    # Backends that keep entries per process or cull them as they fill up
+    evicting_backends = (
+        'django.core.cache.backends.locmem.LocMemCache',
+        'django.core.cache.backends.dummy.DummyCache',
+    )
+    pending_key = 'cart_store:pending'
+
+    def __init__(self):
+        self.flush_every = getattr(settings, 'CART_STORE_FLUSH_EVERY', 20)
+        self.flush_interval = getattr(settings, 'CART_STORE_FLUSH_INTERVAL', 60)
+        alias = getattr(settings, 'CART_STORE_CACHE', 'cart_store')
+        if alias not in settings.CACHES:
+            raise ImproperlyConfigured('CachedCartStore needs a %r cache in CACHES' % alias)
+        if settings.CACHES[alias]['BACKEND'] in self.evicting_backends:
+            raise ImproperlyConfigured('CachedCartStore cannot keep carts in %s, it is not shared '
+                                       'between processes or drops entries' % settings.CACHES[alias]['BACKEND'])
+        self.cache = caches[alias]
+
+    def _key(self, user):
+        return 'cart_store:%s' % user.pk
+
+    def _lock(self, user):
+        return cache_lock(self._key(user) + ':lock', self.lock_timeout, self.lock_wait, self.cache)
+
+    def _load(self, user):
+        state = self.cache.get(self._key(user))
+        if state is None:
+            quantities = dict(Cart.objects.filter(user=user).values_list('product_id', 'quantity'))
+            state = {'quantities': quantities, 'pending': 0, 'since': None}
+        return state
+
+    def _save(self, user, state):
+        if state['pending'] and (state['pending'] >= self.flush_every
+                                 or time.time() - state['since'] >= self.flush_interval):
+            self._write(user, state)
+        self.cache.set(self._key(user), state, None)
+
+    def _set_pending(self, user, since):
+        """Record in the cache since when ``user`` has unflushed changes, or that they have none."""
+        with cache_lock(self.pending_key + ':lock', self.lock_timeout, self.lock_wait, self.cache):
+            pending = self.cache.get(self.pending_key, {})
+            if since is None:
+                pending.pop(user.pk, None)
+            else:
+                pending[user.pk] = since
+            self.cache.set(self.pending_key, pending, None)
+
+    def pending_users(self, older_than=0):
+        """Primary keys of the users whose unflushed changes are at least ``older_than`` seconds old."""
+        now = time.time()
+        return [pk for pk, since in self.cache.get(self.pending_key, {}).items() if now - since >= older_than]
+
+    def _write(self, user, state):
+        quantities = state['quantities']
+        # Skip lines whose product was deleted since they were added
+        product_ids = list(Product.objects.filter(id__in=quantities).values_list('id', flat=True))
+        now = timezone.now()
+        with transaction.atomic():
+            Cart.objects.filter(user=user).exclude(product_id__in=quantities).delete()
+            if product_ids:
+                Cart.objects.bulk_create(
+                    [Cart(user=user, product_id=product_id, quantity=quantities[product_id],
+                          created_at=now, updated_at=now) for product_id in product_ids],
+                    update_conflicts=True, unique_fields=['user_id', 'product_id'],
+                    update_fields=['quantity', 'updated_at'])
+        state['pending'] = 0
+        state['since'] = None
+        self._set_pending(user, None)
+
+    def _change(self, user, state, product_id, quantity):
+        if quantity > 0:
+            state['quantities'][product_id] = quantity
+        else:
+            state['quantities'].pop(product_id, None)
+        if not state['pending']:
+            state['since'] = time.time()
+            self._set_pending(user, state['since'])
+        state['pending'] += 1
+
+    def increment(self, user, product_id, delta=1):
+        with self._lock(user):
+            state = self._load(user)
+            quantities = state['quantities']
+            if product_id not in quantities and not Product.objects.filter(id=product_id).exists():
+                return None
+            quantity = quantities.get(product_id, 0) + delta
+            self._change(user, state, product_id, quantity)
+            self._save(user, state)
+            return quantity
+
+    def decrement(self, user, product_id, delta=1):
+        with self._lock(user):
+            state = self._load(user)
+            if product_id not in state['quantities']:
+                return None
+            quantity = max(state['quantities'][product_id] - delta, 0)
+            self._change(user, state, product_id, quantity)
+            self._save(user, state)
+            return quantity
+
+    def apply(self, user, deltas):
+        with self._lock(user):
+            state = self._load(user)
+            quantities = state['quantities']
+            added = [product_id for product_id, delta in deltas.items() if delta > 0 and product_id not in quantities]
+            if added and Product.objects.filter(id__in=added).count() != len(added):
+                return False
+            for product_id, delta in deltas.items():
+                if delta and (delta > 0 or product_id in quantities):
+                    self._change(user, state, product_id, max(quantities.get(product_id, 0) + delta, 0))
+            self._save(user, state)
+            return True
+
+    def remove_line(self, user, cart_id):
+        product_id = Cart.objects.filter(user=user, id=cart_id).values_list('product_id', flat=True).first()
+        if product_id is None:
+            return False
+        with self._lock(user):
+            state = self._load(user)
+            self._change(user, state, product_id, 0)
+            self._save(user, state)
+            return True
+
+    def merge(self, user, quantities):
+        with self._lock(user):
+            self._flush(user)
+            Cart.objects.merge(user, quantities)
+            self.cache.delete(self._key(user))
+
+    def lines(self, user):
+        quantities = self._load(user)['quantities']
+        if not quantities:
+            return []
+        prices = Product.objects.filter(id__in=quantities).values_list('id', 'price')
+        return [(product_id, quantities[product_id], price) for product_id, price in prices]
+
+    def clear(self, user):
+        with self._lock(user):
+            Cart.objects.filter(user=user).delete()
+            self.cache.delete(self._key(user))
+            self._set_pending(user, None)
+
+    def _flush(self, user):
+        state = self.cache.get(self._key(user))
+        if state is not None and state['pending']:
+            self._write(user, state)
+            self.cache.set(self._key(user), state, None)
+
+    def flush(self, user):
+        with self._lock(user):
+            self._flush(user)
+
+
+def get_cart_store():
+    return import_string(getattr(settings, 'CART_STORE', 'marketplace.stores.DatabaseCartStore'))()
@@ -1,13 +1,32 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from accounts.models import User, UserProfile
-from marketplace.models import Cart
+from marketplace.guest_cart import GUEST_CART_COOKIE
+from marketplace.models import Cart, CartManager
+from marketplace.stores import get_cart_store
+from ecart.cache import LockTimeout
+from marketplace.context_processors import get_cart_counter, get_cart_amounts
+from products.models import Category, Product
 from orders.forms import OrderForm
 from vendor.models import Vendor as V
 from django.contrib.messages import get_messages
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db import OperationalError, connection, connections
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
 # no need of decode here anymore
-from io import BytesIO
+from io import BytesIO, StringIO
 import base64
 
 
@@ -56,7 +75,18 @@ ZnktZGF0ZQAyMDEwLTEyLTI2VDE0OjQ5OjIxKzA5OjAwWK1mQQAAAABJRU5ErkJggg==
 
 
 class BaseTest(TestCase):
+    def use_temporary_cache(self, alias):
+        # A file cache in a directory removed after the test, shared between processes like the real ones
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                      'LOCATION': directory.name, 'OPTIONS': {'MAX_ENTRIES': 10 ** 6}}
+        caches_override = override_settings(CACHES={**settings.CACHES, alias: file_cache})
+        caches_override.enable()
+        self.addCleanup(caches_override.disable)
+
     def setUp(self) -> None:
+        self.use_temporary_cache('guest_carts')
         self.user_credentials = {
             'email': 'Dummy@test.com',
             'password': 'abc@test',
@@ -136,8 +166,11 @@ class AddToCartTest(BaseTest):
 
     def test_get_add_to_cart_without_login(self):
         response = self.client.get(reverse('add_to_cart', kwargs={
-                                   'product_id': 1}), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
-        self.assertEqual(response.json()['status'], 'login_required')
+                                   'product_id': self.p_id}), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(
+            response.json()['message'], 'Added the product to the cart')
+        self.assertIn(GUEST_CART_COOKIE, response.cookies)
+        self.assertFalse(Cart.objects.exists())
 
     def test_without_ajax_call(self):
         self.client.login(email='Dummy@test.com', password="abc@test")
@@ -181,8 +214,9 @@ class DecreaseFromCartTest(BaseTest):
 
     def test_get_decrease_from_cart_without_login(self):
         response = self.client.get(reverse('decrease_cart', kwargs={
-                                   'product_id': 1}), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
-        self.assertEqual(response.json()['status'], 'login_required')
+                                   'product_id': self.p_id}), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(
+            response.json()['message'], 'You do not have this item in your cart!')
 
     def test_without_ajax_call(self):
         self.client.login(email='Dummy@test.com', password="abc@test")
@@ -303,3 +337,320 @@ class CheckoutTest(BaseTest):
         self.client.login(email='Dummy@test.com', password="abc@test")
         response = self.client.get(reverse('checkout'))
         self.assertEqual(response.status_code,302)
+
+
+class CartSummaryTest(BaseTest):
+    def fill_cart(self, count):
+        product = Product.objects.get(id=self.p_id)
+        for i in range(count):
+            extra = Product.objects.create(
+                vendor=product.vendor, category=product.category, title='Extra %s' % i,
+                slug='extra-%s-%s' % (count, i), price=10, image=product.image)
+            Cart.objects.create(user=self.user_creation, product=extra, quantity=2)
+
+    def count_cart_page_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_cart_page_queries_do_not_grow_with_cart_size(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.fill_cart(1)
+        small_cart_queries, response = self.count_cart_page_queries()
+        Cart.objects.all().delete()
+        self.fill_cart(6)
+        large_cart_queries, response = self.count_cart_page_queries()
+        self.assertEqual(small_cart_queries, large_cart_queries)
+        self.assertEqual(response.context['cart_count'], 12)
+        self.assertEqual(response.context['subtotal'], 120)
+
+    def test_summary_is_shared_by_counter_and_amounts(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.fill_cart(3)
+        request = RequestFactory().get('/')
+        request.user = self.user_creation
+        with self.assertNumQueries(1):
+            self.assertEqual(get_cart_counter(request), {'cart_count': 6})
+            self.assertEqual(get_cart_amounts(request)['grand_total'], 60)
+
+
+class ConcurrentCartTest(TransactionTestCase):
+    threads = 8
+    clicks_per_thread = 25
+
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='Dummy@test.com', password='abc@test', first_name='Dummy', last_name='Dummy')
+        vendor_user = User.objects.create_user(
+            email='DummyShop@test.com', password='abc@test', first_name='Dummy', last_name='Dummy')
+        vendor = V.objects.create(
+            user=vendor_user, user_profile=UserProfile.objects.get(user=vendor_user),
+            shop_name='DummyShop', slug='dummyshop')
+        category = Category.objects.create(vendor=vendor, category_name='Bag', slug='bag')
+        self.product = Product.objects.create(
+            vendor=vendor, category=category, title='Dummy Bag', slug='dummy-bag',
+            price=500, image='productimages/casual.jpeg')
+
+    def hammer(self, action):
+        errors = []
+
+        def click():
+            try:
+                for _ in range(self.clicks_per_thread):
+                    while True:
+                        try:
+                            action(self.customer, self.product.id)
+                            break
+                        except OperationalError as e:
+                            # The in-memory test database rejects concurrent writers instead of
+                            # waiting; the rejected statement did not run so it is retried.
+                            if 'locked' not in str(e):
+                                raise
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=click) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_increments_are_not_lost(self):
+        self.hammer(Cart.objects.increment)
+        cart = Cart.objects.get(user=self.customer, product=self.product)
+        self.assertEqual(cart.quantity, self.threads * self.clicks_per_thread)
+
+    def test_parallel_decrements_never_go_below_zero(self):
+        Cart.objects.increment(self.customer, self.product.id, delta=self.threads * self.clicks_per_thread - 10)
+        self.hammer(Cart.objects.decrement)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_increment_racing_a_decrement_to_zero_is_kept(self):
+        Cart.objects.increment(self.customer, self.product.id)
+        execute = CartManager._execute
+
+        def increment_before_delete(manager, sql, params):
+            # Another request adds two while this one goes from the UPDATE to the DELETE
+            if sql.startswith('DELETE') and not increment_before_delete.raced:
+                increment_before_delete.raced = True
+                Cart.objects.increment(self.customer, self.product.id, delta=2)
+            return execute(manager, sql, params)
+        increment_before_delete.raced = False
+
+        with patch.object(CartManager, '_execute', increment_before_delete):
+            self.assertEqual(Cart.objects.decrement(self.customer, self.product.id), 2)
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 2)
+
+
+class UpdateCartTest(BaseTest):
+    def post_operations(self, operations):
+        return self.client.post(
+            reverse('update_cart'), json.dumps({'operations': operations}),
+            content_type='application/json', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_update_cart_without_login(self):
+        response = self.post_operations([{'product_id': self.p_id, 'delta': 2}])
+        self.assertEqual(response.json()['quantities'], {str(self.p_id): 2})
+        self.assertFalse(Cart.objects.exists())
+
+    def test_update_cart_applies_coalesced_operations(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        response = self.post_operations([
+            {'product_id': self.p_id, 'delta': 1},
+            {'product_id': self.p_id, 'delta': 3},
+            {'product_id': self.p_id, 'delta': -1},
+        ])
+        data = response.json()
+        self.assertEqual(data['status'], 'Success')
+        self.assertEqual(data['quantities'], {str(self.p_id): 3})
+        self.assertEqual(data['cart_counter']['cart_count'], 3)
+        self.assertEqual(Decimal(data['cart_amount']['grand_total']), 1500)
+
+    def test_update_cart_removes_line_at_zero(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.post_operations([{'product_id': self.p_id, 'delta': 2}])
+        response = self.post_operations([{'product_id': self.p_id, 'delta': -5}])
+        self.assertEqual(response.json()['quantities'], {str(self.p_id): 0})
+        self.assertFalse(Cart.objects.filter(user=self.user_creation).exists())
+
+    def test_update_cart_rolls_back_on_invalid_product(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        response = self.post_operations([
+            {'product_id': self.p_id, 'delta': 1},
+            {'product_id': 100, 'delta': 1},
+        ])
+        self.assertEqual(response.json()['message'], 'This product does not exist!')
+        self.assertFalse(Cart.objects.filter(user=self.user_creation).exists())
+
+    def test_update_cart_with_malformed_body(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        response = self.client.post(
+            reverse('update_cart'), 'not json', content_type='application/json',
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['message'], 'Invalid request!')
+
+    def test_update_cart_rejects_ids_and_deltas_that_are_not_integers(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.post_operations([{'product_id': self.p_id, 'delta': 2}])
+        for operation in ({'product_id': 10 ** 30, 'delta': 1}, {'product_id': 1e30, 'delta': 1},
+                          {'product_id': self.p_id + 0.9, 'delta': 1}, {'product_id': True, 'delta': 1},
+                          {'product_id': str(self.p_id), 'delta': 1}, {'product_id': self.p_id, 'delta': 1.9}):
+            response = self.post_operations([operation])
+            self.assertEqual(response.status_code, 400)
+            # The stored cart comes back, to undo what the page showed in advance
+            self.assertEqual(response.json()['quantities'], {str(self.p_id): 2})
+        self.assertEqual(Cart.objects.get(user=self.user_creation).quantity, 2)
+        self.client.logout()
+        self.assertEqual(self.post_operations([{'product_id': 10 ** 30, 'delta': 1}]).status_code, 400)
+
+    def test_update_cart_rejects_huge_deltas(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        for operations in ([{'product_id': self.p_id, 'delta': 10 ** 9}],
+                           [{'product_id': self.p_id, 'delta': -1001}],
+                           [{'product_id': self.p_id, 'delta': 600}, {'product_id': self.p_id, 'delta': 600}]):
+            response = self.post_operations(operations)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['message'], 'Quantity change out of range!')
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.post_operations([{'product_id': self.p_id, 'delta': 1000}]).status_code, 200)
+
+
+class GuestCartTest(BaseTest):
+    def add_as_guest(self, product_id):
+        return self.client.get(reverse('add_to_cart', kwargs={
+                               'product_id': product_id}), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_guest_cart_does_not_write_to_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.add_as_guest(self.p_id)
+            response = self.add_as_guest(self.p_id)
+        self.assertEqual(response.json()['qty'], 2)
+        self.assertEqual(response.json()['cart_counter']['cart_count'], 2)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries.captured_queries))
+
+    def test_guest_cart_with_invalid_product(self):
+        response = self.add_as_guest(100)
+        self.assertEqual(
+            response.json()['message'], 'This product does not exist!')
+
+    def test_guest_cart_is_merged_on_login(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.client.get(reverse('add_to_cart', kwargs={
+                        'product_id': self.p_id}), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.client.logout()
+
+        self.add_as_guest(self.p_id)
+        self.add_as_guest(self.p_id)
+        self.client.post(reverse('login'), {'email': 'Dummy@test.com', 'password': 'abc@test'})
+
+        cart = Cart.objects.get(user=self.user_creation)
+        self.assertEqual(cart.quantity, 3)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['cart_count'], 3)
+
+    def test_guest_cart_survives_a_full_default_cache(self):
+        self.add_as_guest(self.p_id)
+        # The default cache culls entries once full, guest carts are not kept there
+        cache.clear()
+        self.assertEqual(self.add_as_guest(self.p_id).json()['qty'], 2)
+
+    def test_guest_sees_their_cart_page(self):
+        self.add_as_guest(self.p_id)
+        self.add_as_guest(self.p_id)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, 200)
+        [item] = response.context['cart_items']
+        self.assertEqual((item.product_id, item.quantity), (self.p_id, 2))
+        self.assertEqual(response.context['cart_count'], 2)
+        self.assertContains(response, 'id="cart-item-guest-%s"' % self.p_id)
+        self.assertNotContains(response, 'class="delete_cart"')
+        self.assertFalse(Cart.objects.exists())
+
+    def test_large_guest_cart_is_merged_in_batches(self):
+        Cart.objects.merge_batch_size = 2
+        self.addCleanup(delattr, Cart.objects, 'merge_batch_size')
+        bag = Product.objects.get(pk=self.p_id)
+        products = [Product.objects.create(
+            vendor=bag.vendor, category=bag.category, title='Bag %s' % i, slug='bag-%s' % i,
+            price=10, image='productimages/casual.jpeg') for i in range(4)]
+        with CaptureQueriesContext(connection) as queries:
+            Cart.objects.merge(self.user_creation, {product.id: 1 for product in products})
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO marketplace_cart')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(Cart.objects.filter(user=self.user_creation).count(), 4)
+
+
+@override_settings(CART_STORE='marketplace.stores.CachedCartStore', CART_STORE_FLUSH_EVERY=3)
+class CachedCartStoreTest(BaseTest):
+    def setUp(self):
+        cache.clear()
+        # locmem is refused
+        self.use_temporary_cache('cart_store')
+        return super().setUp()
+
+    def click(self, name):
+        return self.client.get(reverse(name, kwargs={
+                               'product_id': self.p_id}), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_changes_are_written_behind_in_batches(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.click('add_to_cart')
+        response = self.click('add_to_cart')
+        self.assertEqual(response.json()['message'], 'Increased the cart quantity')
+        self.assertEqual(response.json()['cart_counter']['cart_count'], 2)
+        self.assertFalse(Cart.objects.exists())
+
+        self.click('add_to_cart')
+        self.assertEqual(Cart.objects.get(user=self.user_creation).quantity, 3)
+
+    def test_checkout_flushes_pending_changes(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.click('add_to_cart')
+        self.assertFalse(Cart.objects.exists())
+        response = self.client.get(reverse('checkout'))
+        self.assertIsInstance(response.context['form'], OrderForm)
+        self.assertEqual(Cart.objects.get(user=self.user_creation).quantity, 1)
+
+    def test_decrease_to_zero_removes_line_on_flush(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.click('add_to_cart')
+        get_cart_store().flush(self.user_creation)
+        response = self.click('decrease_cart')
+        self.assertEqual(response.json()['qty'], 0)
+        get_cart_store().flush(self.user_creation)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_locmem_cache_is_refused(self):
+        with override_settings(CACHES={**settings.CACHES, 'cart_store': settings.CACHES['default']}):
+            with self.assertRaises(ImproperlyConfigured):
+                get_cart_store()
+        with override_settings(CACHES={'default': settings.CACHES['default']}):
+            with self.assertRaises(ImproperlyConfigured):
+                get_cart_store()
+
+    def test_flush_carts_writes_carts_left_alone(self):
+        self.client.login(email='Dummy@test.com', password="abc@test")
+        self.click('add_to_cart')
+        call_command('flush_carts', stdout=StringIO())
+        # The change is younger than CART_STORE_FLUSH_INTERVAL
+        self.assertFalse(Cart.objects.exists())
+
+        store = get_cart_store()
+        with override_settings(CART_STORE_FLUSH_INTERVAL=0):
+            self.assertEqual(store.pending_users(0), [self.user_creation.pk])
+            call_command('flush_carts', stdout=StringIO())
+        self.assertEqual(Cart.objects.get(user=self.user_creation).quantity, 1)
+        self.assertEqual(store.pending_users(), [])
+
+    def test_lock_wait_is_bounded(self):
+        store = get_cart_store()
+        store.lock_wait = 0.05
+        caches['cart_store'].add(store._key(self.user_creation) + ':lock', 1, 5)
+        start = time.monotonic()
+        with self.assertRaises(LockTimeout):
+            store.increment(self.user_creation, self.p_id)
+        self.assertLess(time.monotonic() - start, 1)
@@ -9,5 +9,7 @@ urlpatterns = [
     path('decrease_cart/<int:product_id>/', views.decrease_cart, name='decrease_cart'),
     # DELETE CART ITEM
     path('delete_cart/<int:cart_id>/', views.delete_cart, name='delete_cart'),
+    # BATCHED CART UPDATE
+    path('update_cart/', views.update_cart, name='update_cart'),
 
 ]
\ No newline at end of file
@@ -0,0 +1,138 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.utils.functional import cached_property
+
+from products.models import Product
+
+from .guest_cart import get_guest_cart
+from .models import Cart
+from .stores import get_cart_store
+
+
+CENT = Decimal('0.01')
+
+
+class CartPricing:
+    """Per vendor subtotals of a user's Cart rows, from one query grouped by vendor.
+
+    Flush the cart store first, it prices what is in the Cart table.
+    """
+
+    def __init__(self, user):
+        line_total = ExpressionWrapper(
+            F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2))
+        rows = (Cart.objects.filter(user=user).order_by()
+                .values_list('product__vendor_id').annotate(subtotal=Sum(line_total), count=Sum('quantity')))
+        # {vendor_id: subtotal}
+        self.vendor_subtotals = {}
+        self.cart_count = 0
+        for vendor_id, subtotal, count in rows:
+            self.vendor_subtotals[vendor_id] = Decimal(subtotal).quantize(CENT)
+            self.cart_count += count
+
+    @property
+    def vendor_ids(self):
+        return sorted(self.vendor_subtotals)
+
+    @property
+    def subtotal(self):
+        return sum(self.vendor_subtotals.values(), Decimal('0'))
+
+    @property
+    def tax(self):
+        return 0
+
+    @property
+    def grand_total(self):
+        return self.subtotal + self.tax
+
+    def total_data(self):
+        # Order.total_data format: {vendor_id: subtotal as a string}
+        return {vendor_id: str(subtotal) for vendor_id, subtotal in self.vendor_subtotals.items()}
+
+
+def get_cart_pricing(request):
+    pricing = getattr(request, '_cart_pricing', None)
+    if pricing is None:
+        pricing = request._cart_pricing = CartPricing(request.user)
+    return pricing
+
+
+class CartSummary:
+    """Totals of a user's cart, loaded with a single query on first access.
+
+    Anonymous shoppers are summarized from their guest cart.
+    """
+
+    def __init__(self, user, items=None, guest_cart=None, pricing=None):
+        self.user = user
+        self._items = items
+        self._guest_cart = guest_cart
+        self._pricing = pricing
+
+    @cached_property
+    def lines(self):
+        # (product_id, quantity, price) for every cart row
+        if self._items is not None:
+            return [(item.product_id, item.quantity, item.product.price) for item in self._items]
+        if not self.user.is_authenticated:
+            return self._guest_lines()
+        return get_cart_store().lines(self.user)
+
+    def _guest_lines(self):
+        if self._guest_cart is None or not self._guest_cart.quantities:
+            return []
+        quantities = self._guest_cart.quantities
+        prices = Product.objects.filter(id__in=quantities).values_list('id', 'price')
+        return [(product_id, quantities[product_id], price) for product_id, price in prices]
+
+    @cached_property
+    def quantities(self):
+        return {product_id: quantity for product_id, quantity, price in self.lines}
+
+    @property
+    def line_count(self):
+        return len(self.lines)
+
+    @property
+    def cart_count(self):
+        return sum(self.quantities.values())
+
+    @cached_property
+    def subtotal(self):
+        if self._pricing is not None:
+            return self._pricing.subtotal
+        return sum((price * quantity for product_id, quantity, price in self.lines), Decimal('0'))
+
+    @property
+    def tax(self):
+        return 0
+
+    @property
+    def grand_total(self):
+        return self.subtotal + self.tax
+
+    def get_quantity(self, product_id):
+        return self.quantities.get(product_id, 0)
+
+    def counter(self):
+        return dict(cart_count=self.cart_count)
+
+    def amounts(self):
+        return dict(subtotal=self.subtotal, tax=self.tax, grand_total=self.grand_total)
+
+
+def get_cart_summary(request):
+    # Shared by the context processors and the cart views of the same request
+    summary = getattr(request, '_cart_summary', None)
+    if summary is None:
+        summary = reset_cart_summary(request)
+    return summary
+
+
+def reset_cart_summary(request, items=None, pricing=None):
+    # Call after the cart changed, or with already loaded cart items (and pricing) to reuse them
+    guest_cart = None if request.user.is_authenticated else get_guest_cart(request)
+    request._cart_summary = CartSummary(request.user, items, guest_cart, pricing)
+    return request._cart_summary
@@ -1,14 +1,20 @@
+import json
+
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.csrf import ensure_csrf_cookie
 
 from accounts.models import UserProfile
+from ecart.pagination import MAX_PK
 from products.models import Product
 from orders.forms import OrderForm
 
 
+from .guest_cart import get_guest_cart
 from .models import Cart
-from .context_processors import get_cart_counter, get_cart_amounts
+from .stores import get_cart_store
+from .utils import get_cart_pricing, reset_cart_summary
 from django.shortcuts import HttpResponse
 
 
@@ -16,65 +22,126 @@ def is_ajax(request):
     return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
 
+def cart_response(request, data):
+    response = JsonResponse(data)
+    if not request.user.is_authenticated:
+        # Anonymous changes live in the guest cart until the shopper logs in
+        get_guest_cart(request).save(response)
+    return response
+
+
 def add_to_cart(request, product_id):
-    if request.user.is_authenticated:
-        if is_ajax(request=request):
-            # Check if the product item exists
-            try:
-                product = Product.objects.get(id=product_id)
-                # Check if the user has already added that product to the cart
-                try:
-                    chkCart = Cart.objects.get(
-                        user=request.user, product=product)
-                    # Increase the cart quantity
-                    chkCart.quantity += 1
-                    chkCart.save()
-                    return JsonResponse({'status': 'Success', 'message': 'Increased the cart quantity', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-                except:
-                    chkCart = Cart.objects.create(
-                        user=request.user, product=product, quantity=1)
-                    return JsonResponse({'status': 'Success', 'message': 'Added the product to the cart', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-            except:
-                return JsonResponse({'status': 'Failed', 'message': 'This product does not exist!'})
+    if is_ajax(request=request):
+        # Add the product to the cart or increase its quantity
+        if request.user.is_authenticated:
+            quantity = get_cart_store().increment(request.user, product_id)
         else:
-            return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
-
+            quantity = get_guest_cart(request).increment(product_id)
+        if quantity is None:
+            return JsonResponse({'status': 'Failed', 'message': 'This product does not exist!'})
+        if quantity == 1:
+            message = 'Added the product to the cart'
+        else:
+            message = 'Increased the cart quantity'
+        summary = reset_cart_summary(request)
+        return cart_response(request, {'status': 'Success', 'message': message, 'cart_counter': summary.counter(), 'qty': quantity, 'cart_amount': summary.amounts()})
     else:
-        return JsonResponse({'status': 'login_required', 'message': 'Please login to continue'})
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
 
 
 def decrease_cart(request, product_id):
-    if request.user.is_authenticated:
-        if is_ajax(request=request):
-            # Check if the product item exists
-            try:
-                product = Product.objects.get(id=product_id)
-                # Check if the user has already added that product to the cart
-                try:
-                    chkCart = Cart.objects.get(
-                        user=request.user, product=product)
-                    if chkCart.quantity > 1:
-                        # decrease the cart quantity
-                        chkCart.quantity -= 1
-                        chkCart.save()
-                    else:
-                        chkCart.delete()
-                        chkCart.quantity = 0
-                    return JsonResponse({'status': 'Success', 'cart_counter': get_cart_counter(request), 'qty': chkCart.quantity, 'cart_amount': get_cart_amounts(request)})
-                except:
-                    return JsonResponse({'status': 'Failed', 'message': 'You do not have this item in your cart!'})
-            except:
-                return JsonResponse({'status': 'Failed', 'message': 'This product does not exist!'})
+    if is_ajax(request=request):
+        # Decrease the cart quantity, the line is deleted when it reaches zero
+        if request.user.is_authenticated:
+            quantity = get_cart_store().decrement(request.user, product_id)
         else:
-            return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
-
+            quantity = get_guest_cart(request).decrement(product_id)
+        if quantity is None:
+            if not Product.objects.filter(id=product_id).exists():
+                return JsonResponse({'status': 'Failed', 'message': 'This product does not exist!'})
+            return JsonResponse({'status': 'Failed', 'message': 'You do not have this item in your cart!'})
+        summary = reset_cart_summary(request)
+        return cart_response(request, {'status': 'Success', 'cart_counter': summary.counter(), 'qty': quantity, 'cart_amount': summary.amounts()})
     else:
-        return JsonResponse({'status': 'login_required', 'message': 'Please login to continue'})
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
+
+
+# Upper bound of operations accepted by one batched cart update
+MAX_CART_OPERATIONS = 100
+# Largest quantity change of a product in one batched update, either way
+MAX_CART_DELTA = 1000
+
+
+class CartUpdateError(Exception):
+    def __init__(self, message, status=200):
+        super().__init__(message)
+        self.status = status
+
+
+def _cart_int(value, low, high):
+    # JSON numbers only, bool is an int and floats would be truncated
+    if type(value) is not int or not low <= value <= high:
+        raise CartUpdateError('Invalid request!', status=400)
+    return value
+
+
+def parse_cart_operations(body):
+    # Coalesce the [{product_id, delta}] operations into one delta per product
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise CartUpdateError('Invalid request!', status=400)
+    operations = payload.get('operations') if isinstance(payload, dict) else payload
+    if not isinstance(operations, list) or len(operations) > MAX_CART_OPERATIONS:
+        raise CartUpdateError('Invalid request!', status=400)
+    deltas = {}
+    for operation in operations:
+        try:
+            product_id = _cart_int(operation['product_id'], 1, MAX_PK)
+            delta = operation['delta']
+        except (TypeError, KeyError):
+            raise CartUpdateError('Invalid request!', status=400)
+        if type(delta) is not int:
+            raise CartUpdateError('Invalid request!', status=400)
+        deltas[product_id] = deltas.get(product_id, 0) + delta
+        if abs(delta) > MAX_CART_DELTA or abs(deltas[product_id]) > MAX_CART_DELTA:
+            raise CartUpdateError('Quantity change out of range!', status=400)
+    return deltas
+
+
+def update_cart(request):
+    if is_ajax(request=request) and request.method == 'POST':
+        try:
+            deltas = parse_cart_operations(request.body)
+            if request.user.is_authenticated:
+                if not get_cart_store().apply(request.user, deltas):
+                    raise CartUpdateError('This product does not exist!')
+            elif not get_guest_cart(request).apply(deltas):
+                raise CartUpdateError('This product does not exist!')
+        except CartUpdateError as e:
+            # The whole cart as stored, for the page to undo the quantities it showed in advance
+            summary = reset_cart_summary(request)
+            return JsonResponse({'status': 'Failed', 'message': str(e), 'cart_counter': summary.counter(),
+                                 'quantities': summary.quantities, 'cart_amount': summary.amounts()},
+                                status=e.status)
+        summary = reset_cart_summary(request)
+        quantities = {product_id: summary.get_quantity(product_id) for product_id in deltas}
+        return cart_response(request, {'status': 'Success', 'cart_counter': summary.counter(), 'quantities': quantities, 'cart_amount': summary.amounts()})
+    else:
+        return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
 
 
-@login_required(login_url='login')
+@ensure_csrf_cookie
 def cart(request):
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
+    if request.user.is_authenticated:
+        get_cart_store().flush(request.user)
+        cart_items = list(Cart.objects.filter(user=request.user).select_related(
+            'product__vendor').order_by('created_at'))
+    else:
+        # Checking out asks to log in, which merges the guest cart
+        cart_items = get_guest_cart(request).cart_items()
+    # The navbar counter and the totals are derived from the rows loaded here
+    reset_cart_summary(request, cart_items)
     context = {
         'cart_items': cart_items,
     }
@@ -84,14 +151,10 @@ def cart(request):
 def delete_cart(request, cart_id):
     if request.user.is_authenticated:
         if is_ajax(request=request):
-            try:
-                # Check if the cart item exists
-                cart_item = Cart.objects.get(user=request.user, id=cart_id)
-                if cart_item:
-                    cart_item.delete()
-                    return JsonResponse({'status': 'Success', 'message': 'Cart item has been deleted!', 'cart_counter': get_cart_counter(request), 'cart_amount': get_cart_amounts(request)})
-            except:
+            if not get_cart_store().remove_line(request.user, cart_id):
                 return JsonResponse({'status': 'Failed', 'message': 'Cart Item does not exist!'})
+            summary = reset_cart_summary(request)
+            return JsonResponse({'status': 'Success', 'message': 'Cart item has been deleted!', 'cart_counter': summary.counter(), 'cart_amount': summary.amounts()})
         else:
             return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
     else:
@@ -101,12 +164,14 @@ def delete_cart(request, cart_id):
 
 @login_required(login_url='login')
 def checkout(request):
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
-    cart_count = cart_items.count()
-    if cart_count <= 0:
+    get_cart_store().flush(request.user)
+    pricing = get_cart_pricing(request)
+    if pricing.cart_count <= 0:
         return redirect('home')
+    cart_items = list(Cart.objects.filter(user=request.user).select_related(
+        'product__vendor').order_by('created_at'))
 
-    user_profile = UserProfile.objects.get(user=request.user)
+    user_profile, created = UserProfile.objects.get_or_create(user=request.user)
     default_values = {
         'first_name': request.user.first_name,
         'last_name': request.user.last_name,
@@ -119,6 +184,7 @@ def checkout(request):
         'pin_code': user_profile.pin_code,
     }
     form = OrderForm(initial=default_values)
+    reset_cart_summary(request, cart_items, pricing)
     context = {
         'form': form,
         'cart_items': cart_items,
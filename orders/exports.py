@@ -0,0 +1,115 @@
+import csv
+import datetime
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import OrderedProduct, VendorOrder
+
+
+# Each export is one row per vendor sub-order or per ordered product, of paid orders only.
+# The columns are (header, lookup) pairs read with values_list, so rows are never built
+# as model instances.
+EXPORT_COLUMNS = {
+    'orders': (
+        ('order_number', 'order__order_number'),
+        ('created_at', 'created_at'),
+        ('vendor', 'vendor__shop_name'),
+        ('status', 'status'),
+        ('first_name', 'order__first_name'),
+        ('last_name', 'order__last_name'),
+        ('email', 'order__email'),
+        ('city', 'order__city'),
+        ('country', 'order__country'),
+        ('payment_method', 'order__payment__payment_method'),
+        ('transaction_id', 'order__payment__transaction_id'),
+        ('subtotal', 'subtotal'),
+        ('tax', 'tax'),
+    ),
+    'items': (
+        ('order_number', 'order__order_number'),
+        ('created_at', 'order__created_at'),
+        ('vendor', 'product__vendor__shop_name'),
+        ('product', 'product__title'),
+        ('quantity', 'quantity'),
+        ('price', 'price'),
+        ('amount', 'amount'),
+        ('transaction_id', 'payment__transaction_id'),
+    ),
+}
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_export_date(value):
+    """A ``YYYY-MM-DD`` string as a date, None if it is empty."""
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ExportError('Invalid date %r, expected YYYY-MM-DD' % value)
+
+
+def day_start(date):
+    # Midnight in TIME_ZONE, so the range filter stays a plain created_at comparison the index can use
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+def export_queryset(kind, vendor=None, start=None, end=None):
+    """Rows of the ``kind`` export, oldest first, between the ``start`` and ``end`` days inclusive."""
+    if kind not in EXPORT_COLUMNS:
+        raise ExportError('Unknown export %r, expected one of %s' % (kind, ', '.join(EXPORT_COLUMNS)))
+    if kind == 'orders':
+        queryset = VendorOrder.objects.filter(order__is_ordered=True)
+        vendor_lookup, date_lookup = 'vendor', 'created_at'
+    else:
+        queryset = OrderedProduct.objects.all()
+        vendor_lookup, date_lookup = 'product__vendor', 'order__created_at'
+    if vendor is not None:
+        queryset = queryset.filter(**{vendor_lookup: vendor})
+    if start is not None:
+        queryset = queryset.filter(**{date_lookup + '__gte': day_start(start)})
+    if end is not None:
+        queryset = queryset.filter(**{date_lookup + '__lt': day_start(end + datetime.timedelta(days=1))})
+    lookups = [lookup for header, lookup in EXPORT_COLUMNS[kind]]
+    return queryset.order_by(date_lookup, 'id').values_list(*lookups)
+
+
+class Echo:
+    # csv.writer target that hands each formatted line back instead of buffering it
+    def write(self, value):
+        return value
+
+
+def export_lines(kind, export_format='csv', vendor=None, start=None, end=None):
+    """The export as a generator of text lines, reading ORDER_EXPORT_CHUNK_SIZE rows at a time."""
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError('Unknown format %r, expected one of %s' % (export_format, ', '.join(EXPORT_FORMATS)))
+    headers = [header for header, lookup in EXPORT_COLUMNS[kind]] if kind in EXPORT_COLUMNS else None
+    rows = export_queryset(kind, vendor, start, end).iterator(chunk_size=settings.ORDER_EXPORT_CHUNK_SIZE)
+
+    def generate():
+        if export_format == 'csv':
+            writer = csv.writer(Echo())
+            yield writer.writerow(headers)
+            for row in rows:
+                yield writer.writerow(row)
+        else:
+            for row in rows:
+                yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+    return generate()
+
+
+def export_filename(kind, export_format, vendor=None, start=None, end=None):
+    parts = [kind]
+    if vendor is not None:
+        parts.append(vendor.slug)
+    if start or end:
+        parts.append('%s_%s' % (start or '', end or ''))
+    return '%s.%s' % ('-'.join(parts), export_format)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.exports import EXPORT_COLUMNS, EXPORT_FORMATS, ExportError, export_lines, parse_export_date
+from vendor.models import Vendor
+
+
+class Command(BaseCommand):
+    help = 'Stream the paid orders or their line items as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORT_COLUMNS), help='One row per vendor sub-order, or per ordered product')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--vendor', help='Slug of the vendor to export')
+        parser.add_argument('--from', dest='start', help='First day included, YYYY-MM-DD')
+        parser.add_argument('--to', dest='end', help='Last day included, YYYY-MM-DD')
+        parser.add_argument('--output', help='File to write instead of stdout')
+
+    def handle(self, *args, **options):
+        vendor = None
+        if options['vendor']:
+            try:
+                vendor = Vendor.objects.get(slug=options['vendor'])
+            except Vendor.DoesNotExist:
+                raise CommandError('No vendor with slug %r' % options['vendor'])
+        try:
+            lines = export_lines(options['kind'], options['format'], vendor,
+                                 parse_export_date(options['start']), parse_export_date(options['end']))
+        except ExportError as error:
+            raise CommandError(error)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import VendorDailyRevenue
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily vendor revenue rollups from the paid vendor orders'
+
+    def handle(self, *args, **options):
+        rows = VendorDailyRevenue.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS('Rebuilt %d vendor/day rows' % rows))
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.1 on 2026-10-18 21:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendor', '0004_auto_20220913_1543'),
+        ('orders', '0003_order_total_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorOrder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tax', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('status', models.CharField(choices=[('New', 'New'), ('Accepted', 'Accepted'), ('Completed', 'Completed'), ('Cancelled', 'Cancelled')], default='New', max_length=15)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendor_orders', to='orders.order')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendor_orders', to='vendor.vendor')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vendororder',
+            index=models.Index(fields=['vendor', 'created_at'], name='vendor_order_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='vendororder',
+            constraint=models.UniqueConstraint(fields=('order', 'vendor'), name='unique_vendor_order'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.1.1 on 2026-10-18 21:05
+
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+def backfill_vendor_orders(apps, schema_editor):
+    # One VendorOrder per {vendor_id: subtotal} entry of Order.total_data
+    Order = apps.get_model('orders', 'Order')
+    Vendor = apps.get_model('vendor', 'Vendor')
+    VendorOrder = apps.get_model('orders', 'VendorOrder')
+    vendor_ids = set(Vendor.objects.values_list('id', flat=True))
+    rows = []
+    for order in Order.objects.exclude(total_data=None).iterator(chunk_size=1000):
+        total_data = order.total_data
+        try:
+            if isinstance(total_data, str):
+                total_data = json.loads(total_data)
+            subtotals = [(int(vendor_id), Decimal(str(subtotal))) for vendor_id, subtotal in total_data.items()]
+        except (ValueError, TypeError, AttributeError, InvalidOperation):
+            continue
+        for vendor_id, subtotal in subtotals:
+            if vendor_id in vendor_ids:
+                rows.append(VendorOrder(order_id=order.id, vendor_id=vendor_id, subtotal=subtotal,
+                                        status=order.status, created_at=order.created_at))
+        if len(rows) >= 1000:
+            VendorOrder.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    VendorOrder.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_vendororder'),
+        ('vendor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_vendor_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.1 on 2026-10-18 21:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from orders.utils import rebuild_daily_revenue
+
+
+def backfill_daily_revenue(apps, schema_editor):
+    # The same rollup as VendorDailyRevenue.objects.rebuild(), from the orders paid so far
+    rebuild_daily_revenue(apps.get_model('orders', 'VendorDailyRevenue'), apps.get_model('orders', 'VendorOrder'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendor', '0004_auto_20220913_1543'),
+        ('orders', '0005_backfill_vendororder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorDailyRevenue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='vendor.vendor')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='vendordailyrevenue',
+            constraint=models.UniqueConstraint(fields=('vendor', 'date'), name='unique_vendor_daily_revenue'),
+        ),
+        migrations.RunPython(backfill_daily_revenue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.1 on 2026-10-18 21:07
+
+from django.db import migrations, models
+import orders.utils
+
+
+def renumber_duplicates(apps, schema_editor):
+    # Orders left without a number, or sharing one, by the old save-then-number flow
+    # get a fresh number so the unique index can be built
+    Order = apps.get_model('orders', 'Order')
+    seen = set()
+    for order in Order.objects.order_by('id').only('id', 'order_number').iterator(chunk_size=1000):
+        if order.order_number and order.order_number not in seen:
+            seen.add(order.order_number)
+            continue
+        Order.objects.filter(id=order.id).update(order_number=orders.utils.generate_order_number())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_vendordailyrevenue'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(default=orders.utils.generate_order_number, max_length=20, unique=True),
+        ),
+    ]
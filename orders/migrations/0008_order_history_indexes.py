@@ -0,0 +1,25 @@
+# Generated by Django 4.1.1 on 2026-10-18 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_number_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vendororder',
+            name='vendor_order_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'is_ordered', 'created_at', 'id'], name='order_user_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vendororder',
+            index=models.Index(fields=['vendor', 'created_at', 'id'], name='vendor_order_history_idx'),
+        ),
+    ]
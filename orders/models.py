@@ -1,13 +1,14 @@
 import jsonfield
-import json
-from django.db import models
+from django.db import connection, models
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
 from accounts.models import User
 from products.models import Product
 
 from vendor.models import Vendor
 
-
-request_object = ''
+from .request_object import get_current_vendor
+from .utils import generate_order_number, rebuild_daily_revenue
 
 
 class Payment(models.Model):
@@ -37,7 +38,7 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, blank=True, null=True)
     vendors = models.ManyToManyField(Vendor, blank=True)
-    order_number = models.CharField(max_length=20)
+    order_number = models.CharField(max_length=20, unique=True, default=generate_order_number)
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     phone = models.CharField(max_length=15, blank=True)
@@ -57,6 +58,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # customer order history, keyset paginated on (created_at, id)
+            models.Index(fields=['user', 'is_ordered', 'created_at', 'id'], name='order_user_history_idx'),
+        ]
+
     # Concatenate first name and last name
     @property
     def name(self):
@@ -67,14 +74,10 @@ class Order(models.Model):
         return ", ".join([str(i) for i in self.vendors.all()])
 
     def get_total_by_vendor(self):
-        vendor = Vendor.objects.get(user=request_object.user)
-        subtotal = 0
-        tax = 0
-        if self.total_data:
-            total_data = json.loads(self.total_data)
-            subtotal = total_data.get(str(vendor.id))
-            
-        grand_total = float(subtotal) + float(tax)
+        # Totals of the vendor making the current request
+        vendor_order = self.vendor_orders.filter(vendor=get_current_vendor()).first()
+        subtotal = vendor_order.subtotal if vendor_order else 0
+        grand_total = vendor_order.grand_total if vendor_order else 0
         context = {
             'subtotal': subtotal,
             'grand_total': grand_total,
@@ -82,9 +85,6 @@ class Order(models.Model):
 
         return context
 
-
-    
-
     def __str__(self):
         return self.order_number
 
@@ -101,4 +101,118 @@ class OrderedProduct(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.product.title
\ No newline at end of file
+        return self.product.title
+
+
+class VendorOrderManager(models.Manager):
+    def transition(self, vendor, ids, status):
+        """Move the vendor's paid sub-orders ``ids`` to ``status`` in one conditional UPDATE.
+
+        Sub-orders whose current status does not allow the move are left alone.
+        Returns the ``(id, order_id)`` pairs that changed (``RETURNING``, SQLite >= 3.35).
+        """
+        sources = [source for source, targets in self.model.TRANSITIONS.items() if status in targets]
+        ids = [int(pk) for pk in ids]
+        if not sources or not ids:
+            return []
+        table = self.model._meta.db_table
+        order_table = Order._meta.db_table
+        sql = (
+            f'UPDATE {table} SET status = %s, updated_at = %s '
+            f'WHERE vendor_id = %s AND id IN ({", ".join(["%s"] * len(ids))}) '
+            f'AND status IN ({", ".join(["%s"] * len(sources))}) '
+            f'AND order_id IN (SELECT id FROM {order_table} WHERE is_ordered = %s) '
+            f'RETURNING id, order_id'
+        )
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [status, now, vendor.pk, *ids, *sources, True])
+            changed = cursor.fetchall()
+        if changed:
+            # The whole order follows once every vendor's part has reached the status
+            other_status = self.model.objects.filter(order=OuterRef('pk')).exclude(status=status)
+            (Order.objects.filter(id__in={order_id for pk, order_id in changed})
+             .exclude(status=status).exclude(Exists(other_status)).update(status=status))
+        return changed
+
+
+class VendorOrder(models.Model):
+    """One vendor's part of an order, written by place_order."""
+    # status -> statuses a vendor may move it to
+    TRANSITIONS = {
+        'New': ('Accepted', 'Cancelled'),
+        'Accepted': ('Completed', 'Cancelled'),
+        'Completed': (),
+        'Cancelled': (),
+    }
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='vendor_orders')
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='vendor_orders')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    tax = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    status = models.CharField(max_length=15, choices=Order.STATUS, default='New')
+    # copied from the order, so vendor revenue per period is read from this table alone
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VendorOrderManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'vendor'], name='unique_vendor_order'),
+        ]
+        indexes = [
+            models.Index(fields=['vendor', 'created_at', 'id'], name='vendor_order_history_idx'),
+        ]
+
+    @property
+    def grand_total(self):
+        return self.subtotal + self.tax
+
+    def can_transition(self, status):
+        return status in self.TRANSITIONS.get(self.status, ())
+
+    def __str__(self):
+        return '%s - %s' % (self.order, self.vendor)
+
+
+class VendorDailyRevenueManager(models.Manager):
+    """Upkeep of the per vendor, per day revenue rollup.
+
+    Days are calendar days in the configured TIME_ZONE, the day of a paid
+    order is the day of its payment.
+    """
+
+    def record_order(self, order, date):
+        """Add the vendor orders of a just paid ``order`` to the rollup of ``date``."""
+        table = self.model._meta.db_table
+        vendor_order_table = VendorOrder._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (vendor_id, date, revenue, orders_count) '
+                f'SELECT vendor_id, %s, subtotal + tax, 1 FROM {vendor_order_table} WHERE order_id = %s '
+                f'ON CONFLICT (vendor_id, date) DO UPDATE '
+                f'SET revenue = {table}.revenue + excluded.revenue, '
+                f'orders_count = {table}.orders_count + excluded.orders_count',
+                [connection.ops.adapt_datefield_value(date), order.pk])
+
+    def rebuild(self):
+        """Recompute every row from the VendorOrder table, returns the number of rows."""
+        return rebuild_daily_revenue(self.model, VendorOrder)
+
+
+class VendorDailyRevenue(models.Model):
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='daily_revenue')
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+
+    objects = VendorDailyRevenueManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'date'], name='unique_vendor_daily_revenue'),
+        ]
+
+    def __str__(self):
+        return '%s - %s' % (self.vendor, self.date)
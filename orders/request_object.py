@@ -1,18 +1,49 @@
-from . import models
+import asyncio
+import contextvars
+
+from django.utils.decorators import sync_and_async_middleware
+
+from vendor.models import Vendor
+
+
+# The request being handled by the current thread or asyncio task. A ContextVar,
+# unlike a module global, is not shared by concurrent requests.
+_current_request = contextvars.ContextVar('current_request', default=None)
 
-def RequestObjectMiddleware(get_response):
-    # One-time configuration and initialization.
 
-    def middleware(request):
-        # Code to be executed for each request before
-        # the view (and later middleware) are called.
-        models.request_object = request
+def get_current_request():
+    return _current_request.get()
 
-        response = get_response(request)
 
-        # Code to be executed for each request/response after
-        # the view is called.
+def get_request_vendor(request):
+    """The Vendor of ``request.user``, fetched once per request (None if they are not a vendor)."""
+    if not hasattr(request, '_vendor'):
+        user = request.user
+        request._vendor = Vendor.objects.filter(user=user).first() if user.is_authenticated else None
+    return request._vendor
 
-        return response
 
-    return middleware
\ No newline at end of file
+def get_current_vendor():
+    request = get_current_request()
+    return get_request_vendor(request) if request is not None else None
+
+
+@sync_and_async_middleware
+def RequestObjectMiddleware(get_response):
+    # Makes the request available to code without access to it, like model methods called from templates
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _current_request.set(request)
+            try:
+                return await get_response(request)
+            finally:
+                _current_request.reset(token)
+    else:
+        def middleware(request):
+            token = _current_request.set(request)
+            try:
+                return get_response(request)
+            finally:
+                _current_request.reset(token)
+
+    return middleware
@@ -1,10 +1,29 @@
 from urllib import response
+import asyncio
+import csv
+import datetime
+import importlib
+import threading
+from unittest.mock import patch
+import json
+from decimal import Decimal
+from django.apps import apps
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.core.management import call_command
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from io import StringIO
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from accounts.models import User, UserProfile
+from accounts.models import OutboxEmail, User, UserProfile
 from marketplace.models import Cart
 from orders.forms import OrderForm
-from orders.models import Order, OrderedProduct
+from orders.models import Order, OrderedProduct, Payment, VendorDailyRevenue, VendorOrder
+from orders.request_object import RequestObjectMiddleware, get_current_request, get_current_vendor
+from orders.utils import generate_order_number
 from products.models import Category, Product
 from django.contrib.messages import get_messages
 from vendor.models import Vendor as V
@@ -314,4 +333,542 @@ class OrderConfirmTest(BaseTest):
         }
         response = self.client.get(reverse('order_complete'),data=data)
         self.assertEqual(response.url,reverse('home'))
-        
\ No newline at end of file
+        
+
+class OrderFixtureMixin:
+    order_data = {
+        'first_name': 'Dummy',
+        'last_name': 'Dummy',
+        'phone': '325949745412',
+        'email': 'Dummy@test.com',
+        'address': 'aaskd,test',
+        'country': 'India',
+        'state': 'MAh',
+        'city': 'pune',
+        'pin_code': '443302',
+        'payment_method': 'COD'
+    }
+
+    products_per_vendor = 5
+
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='Dummy@test.com', password='abc@test', first_name='Dummy', last_name='Dummy')
+        self.customer.is_active = True
+        self.customer.role = User.CUSTOMER
+        self.customer.save()
+        self.products = []
+        for shop in ('ShopA', 'ShopB'):
+            user = User.objects.create_user(
+                email='%s@test.com' % shop, password='abc@test', first_name=shop, last_name=shop)
+            vendor = V.objects.create(
+                user=user, user_profile=UserProfile.objects.get(user=user), shop_name=shop, slug=shop.lower())
+            category = Category.objects.create(vendor=vendor, category_name='Bag', slug='bag-%s' % shop.lower())
+            self.products += [
+                Product.objects.create(vendor=vendor, category=category, title='Bag %s' % i,
+                                       slug='bag-%s-%s' % (shop.lower(), i), price='10.50',
+                                       image='productimages/casual.jpeg')
+                for i in range(self.products_per_vendor)
+            ]
+        self.client.login(username='Dummy@test.com', password='abc@test')
+
+    def fill_cart(self, products):
+        Cart.objects.filter(user=self.customer).delete()
+        for quantity, product in enumerate(products, start=1):
+            Cart.objects.create(user=self.customer, product=product, quantity=quantity)
+
+    def place_and_pay(self, products, transaction_id):
+        self.fill_cart(products)
+        order = self.client.post(reverse('place_order'), self.order_data).context['order']
+        self.client.post(reverse('payments'), {
+            'order_number': order.order_number,
+            'transaction_id': transaction_id,
+            'payment_method': 'COD',
+            'status': 'SUCCESS',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return order
+
+
+class PlaceOrderPricingTest(OrderFixtureMixin, TestCase):
+
+    def count_place_order_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('place_order'), self.order_data)
+        self.assertIsInstance(response.context['order'], Order)
+        return len(queries)
+
+    def test_place_order_prices_per_vendor(self):
+        self.fill_cart([self.products[0], self.products[1], self.products[5]])
+        response = self.client.post(reverse('place_order'), self.order_data)
+        order = response.context['order']
+        shop_a, shop_b = self.products[0].vendor_id, self.products[5].vendor_id
+        self.assertEqual(json.loads(order.total_data), {str(shop_a): '31.50', str(shop_b): '31.50'})
+        self.assertEqual(order.total, 63)
+        self.assertEqual(set(order.vendors.values_list('id', flat=True)), {shop_a, shop_b})
+        self.assertEqual(response.context['grand_total'], Decimal('63.00'))
+
+    def test_place_order_queries_do_not_grow_with_cart(self):
+        self.fill_cart(self.products[:1])
+        small = self.count_place_order_queries()
+        self.fill_cart(self.products)
+        self.assertEqual(self.count_place_order_queries(), small)
+
+
+class FinalizeOrderTest(OrderFixtureMixin, TestCase):
+    products_per_vendor = 25
+
+    def place_order(self):
+        self.fill_cart(self.products)
+        return self.client.post(reverse('place_order'), self.order_data).context['order']
+
+    def pay(self, order, transaction_id='TX-1'):
+        data = {
+            'order_number': order.order_number,
+            'transaction_id': transaction_id,
+            'payment_method': 'COD',
+            'status': 'SUCCESS',
+        }
+        return self.client.post(reverse('payments'), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_fifty_lines_take_a_handful_of_queries(self):
+        order = self.place_order()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.pay(order)
+        self.assertEqual(response.json()['transaction_id'], 'TX-1')
+        self.assertLessEqual(len(queries), 15)
+        self.assertEqual(OrderedProduct.objects.filter(order=order).count(), 50)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+        order.refresh_from_db()
+        self.assertTrue(order.is_ordered)
+        self.assertEqual(order.payment.transaction_id, 'TX-1')
+
+    def test_duplicate_post_does_not_insert_again(self):
+        order = self.place_order()
+        self.pay(order)
+        response = self.pay(order, 'TX-2')
+        self.assertEqual(response.json(), {'order_number': order.order_number, 'transaction_id': 'TX-1'})
+        self.assertEqual(Payment.objects.filter(user=self.customer).count(), 1)
+        self.assertEqual(OrderedProduct.objects.filter(order=order).count(), 50)
+
+
+class VendorOrderTest(OrderFixtureMixin, TestCase):
+    def test_place_order_writes_one_vendor_order_per_vendor(self):
+        order = self.place_and_pay([self.products[0], self.products[1], self.products[5]], 'TX-1')
+        vendor_orders = {vendor_order.vendor_id: vendor_order.subtotal for vendor_order in order.vendor_orders.all()}
+        self.assertEqual(vendor_orders, {
+            self.products[0].vendor_id: Decimal('31.50'),
+            self.products[5].vendor_id: Decimal('31.50'),
+        })
+
+    def test_vendor_dashboard_sums_vendor_orders(self):
+        self.place_and_pay([self.products[0], self.products[1]], 'TX-1')
+        self.place_and_pay([self.products[2], self.products[5]], 'TX-2')
+        # placed but never paid, not revenue
+        self.fill_cart([self.products[3]])
+        self.client.post(reverse('place_order'), self.order_data)
+
+        vendor = self.products[0].vendor
+        vendor.user.is_active = True
+        vendor.user.role = User.VENDOR
+        vendor.user.save()
+        self.client.login(username=vendor.user.email, password='abc@test')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('vendorDashboard'))
+        self.assertEqual(response.context['orders_count'], 2)
+        self.assertEqual(response.context['total_revenue'], Decimal('42.00'))
+        self.assertEqual(response.context['current_month_revenue'], Decimal('42.00'))
+        dashboard_queries = len(queries)
+
+        self.client.login(username='Dummy@test.com', password='abc@test')
+        self.place_and_pay([self.products[4]], 'TX-3')
+        self.client.login(username=vendor.user.email, password='abc@test')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('vendorDashboard'))
+        self.assertEqual(response.context['total_revenue'], Decimal('52.50'))
+        self.assertEqual(len(queries), dashboard_queries)
+
+    def test_backfill_from_total_data(self):
+        backfill = importlib.import_module('orders.migrations.0005_backfill_vendororder').backfill_vendor_orders
+        order = self.place_and_pay([self.products[0], self.products[5]], 'TX-1')
+        VendorOrder.objects.all().delete()
+        backfill(apps, None)
+        self.assertEqual(
+            sorted(order.vendor_orders.values_list('vendor_id', 'subtotal')),
+            [(self.products[0].vendor_id, Decimal('10.50')), (self.products[5].vendor_id, Decimal('21.00'))])
+
+
+class RequestContextTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            email='DummyShop@test.com', password='abc@test', first_name='Dummy', last_name='Dummy')
+        self.vendor = V.objects.create(
+            user=self.user, user_profile=UserProfile.objects.get(user=self.user), shop_name='DummyShop',
+            slug='dummyshop')
+
+    def make_request(self, path, user=None):
+        request = self.factory.get(path)
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_concurrent_threads_see_their_own_request(self):
+        barrier = threading.Barrier(2)
+        seen = {}
+
+        def view(request):
+            barrier.wait()
+            seen[request.path] = get_current_request().path
+            return HttpResponse()
+
+        middleware = RequestObjectMiddleware(view)
+        threads = [threading.Thread(target=middleware, args=(self.make_request(path),)) for path in ('/a/', '/b/')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(seen, {'/a/': '/a/', '/b/': '/b/'})
+        self.assertIsNone(get_current_request())
+
+    def test_concurrent_tasks_see_their_own_request(self):
+        seen = {}
+
+        async def view(request):
+            await asyncio.sleep(0.01)
+            seen[request.path] = get_current_request().path
+            return HttpResponse()
+
+        middleware = RequestObjectMiddleware(view)
+
+        async def handle_both():
+            await asyncio.gather(middleware(self.make_request('/a/')), middleware(self.make_request('/b/')))
+        asyncio.run(handle_both())
+        self.assertEqual(seen, {'/a/': '/a/', '/b/': '/b/'})
+
+    def test_vendor_is_fetched_once_per_request(self):
+        def view(request):
+            with self.assertNumQueries(1):
+                vendors = [get_current_vendor() for i in range(3)]
+            self.assertEqual(vendors, [self.vendor] * 3)
+            return HttpResponse()
+
+        RequestObjectMiddleware(view)(self.make_request('/', self.user))
+        self.assertIsNone(get_current_vendor())
+
+
+class VendorDailyRevenueTest(OrderFixtureMixin, TestCase):
+    def rollup(self):
+        return sorted(VendorDailyRevenue.objects.values_list('vendor_id', 'date', 'revenue', 'orders_count'))
+
+    def test_payment_updates_rollup_incrementally(self):
+        self.place_and_pay([self.products[0], self.products[5]], 'TX-1')
+        self.place_and_pay([self.products[1]], 'TX-2')
+        today = timezone.localdate()
+        shop_a, shop_b = self.products[0].vendor_id, self.products[5].vendor_id
+        self.assertEqual(self.rollup(), [(shop_a, today, Decimal('21.00'), 2), (shop_b, today, Decimal('21.00'), 1)])
+        incremental = self.rollup()
+        call_command('rebuild_revenue_rollups', stdout=StringIO())
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_migration_backfills_orders_paid_before(self):
+        self.place_and_pay([self.products[0], self.products[5]], 'TX-1')
+        expected = self.rollup()
+        VendorDailyRevenue.objects.all().delete()
+        backfill = importlib.import_module('orders.migrations.0006_vendordailyrevenue').backfill_daily_revenue
+        backfill(apps, None)
+        self.assertEqual(self.rollup(), expected)
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_days_follow_the_configured_timezone(self):
+        self.place_and_pay([self.products[0]], 'TX-1')
+        # 20:00 UTC on January 31st is already February 1st in India
+        Payment.objects.filter(transaction_id='TX-1').update(
+            created_at=datetime.datetime(2026, 1, 31, 20, 0, tzinfo=datetime.timezone.utc))
+        VendorDailyRevenue.objects.rebuild()
+        self.assertEqual(VendorDailyRevenue.objects.get().date, datetime.date(2026, 2, 1))
+
+    def test_dashboard_month_to_date_uses_rollup_rows(self):
+        vendor = self.products[0].vendor
+        month_start = timezone.localdate().replace(day=1)
+        VendorDailyRevenue.objects.bulk_create([
+            VendorDailyRevenue(vendor=vendor, date=month_start - datetime.timedelta(days=1), revenue=100, orders_count=3),
+            VendorDailyRevenue(vendor=vendor, date=month_start, revenue=40, orders_count=1),
+        ])
+        vendor.user.is_active = True
+        vendor.user.role = User.VENDOR
+        vendor.user.save()
+        self.client.login(username=vendor.user.email, password='abc@test')
+        response = self.client.get(reverse('vendorDashboard'))
+        self.assertEqual(response.context['orders_count'], 4)
+        self.assertEqual(response.context['total_revenue'], Decimal('140.00'))
+        self.assertEqual(response.context['current_month_revenue'], Decimal('40.00'))
+
+
+class OrderNumberTest(OrderFixtureMixin, TestCase):
+    def test_numbers_are_unique_and_increasing_across_threads(self):
+        numbers = []
+
+        def generate():
+            numbers.extend(generate_order_number() for i in range(2000))
+
+        threads = [threading.Thread(target=generate) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(numbers)), 8000)
+        self.assertEqual({len(number) for number in numbers}, {19})
+        first, second = generate_order_number(), generate_order_number()
+        self.assertLess(first, second)
+        self.assertLess(int(first), int(second))
+
+    def test_place_order_inserts_the_order_once(self):
+        self.fill_cart(self.products[:2])
+        with CaptureQueriesContext(connection) as queries:
+            order = self.client.post(reverse('place_order'), self.order_data).context['order']
+        order_writes = [query['sql'] for query in queries
+                        if query['sql'].startswith(('INSERT INTO "orders_order"', 'UPDATE "orders_order"'))]
+        self.assertEqual(len(order_writes), 1)
+        self.assertTrue(order_writes[0].startswith('INSERT'))
+        self.assertEqual(Order.objects.get(order_number=order.order_number).id, order.id)
+        # The number is numeric, as the order_detail URLs expect
+        self.assertEqual(reverse('order_detail', args=[order.order_number]),
+                         '/account/customer/order_detail/%s/' % order.order_number)
+
+    def test_number_clash_with_another_process_is_retried(self):
+        self.fill_cart(self.products[:1])
+        taken = self.client.post(reverse('place_order'), self.order_data).context['order'].order_number
+        fresh = generate_order_number()
+        with patch('orders.views.generate_order_number', side_effect=[taken, fresh]):
+            order = self.client.post(reverse('place_order'), self.order_data).context['order']
+        self.assertEqual(order.order_number, fresh)
+        self.assertEqual(Order.objects.filter(order_number=taken).count(), 1)
+
+
+@override_settings(ORDER_HISTORY_PAGE_SIZE=10)
+class OrderHistoryPaginationTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.vendor = self.products[0].vendor
+        start = timezone.now() - datetime.timedelta(days=30)
+        for i in range(23):
+            order = Order.objects.create(
+                user=self.customer, first_name='Dummy', last_name='Dummy', email='Dummy@test.com',
+                address='aaskd,test', city='pune', pin_code='443302', total=10.5, payment_method='COD',
+                is_ordered=True)
+            created_at = start + datetime.timedelta(hours=i)
+            Order.objects.filter(id=order.id).update(created_at=created_at)
+            VendorOrder.objects.create(order=order, vendor=self.vendor, subtotal='10.50', created_at=created_at)
+        self.newest_first = list(Order.objects.order_by('-created_at').values_list('order_number', flat=True))
+
+    def walk(self, url, key):
+        pages, queries, cursor = [], [], ''
+        while True:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            queries.append(len(captured))
+            items = response.context[key]
+            pages.append([getattr(item, 'order', item).order_number for item in items])
+            page = response.context['page']
+            if not page.has_next:
+                return pages, queries
+            cursor = page.next_cursor
+
+    def test_customer_history_pages_newest_first(self):
+        pages, queries = self.walk(reverse('customer_my_orders'), 'orders')
+        self.assertEqual([len(page) for page in pages], [10, 10, 3])
+        self.assertEqual(sum(pages, []), self.newest_first)
+        # a deep page costs what the first one does
+        self.assertEqual(len(set(queries)), 1)
+
+        response = self.client.get(reverse('custDashboard'))
+        self.assertEqual([order.order_number for order in response.context['recent_orders']], self.newest_first[:5])
+        self.assertEqual(response.context['orders_count'], 23)
+
+    def test_vendor_dashboard_lists_the_newest_sub_orders(self):
+        self.vendor.user.is_active = True
+        self.vendor.user.role = User.VENDOR
+        self.vendor.user.save()
+        newest = VendorOrder.objects.get(order__order_number=self.newest_first[0])
+        VendorOrder.objects.filter(id=newest.id).update(status='Accepted')
+        self.client.login(username=self.vendor.user.email, password='abc@test')
+        response = self.client.get(reverse('vendorDashboard'))
+        self.assertEqual([vendor_order.order.order_number for vendor_order in response.context['recent_orders']],
+                         self.newest_first[:10])
+        # The vendor's own status, the order stays New until every shop accepted
+        self.assertContains(response, '<td>Accepted</td>', html=False)
+
+    def test_forged_cursor_shows_first_page(self):
+        cursor = base64.urlsafe_b64encode(json.dumps(['next', timezone.now().isoformat(), 10 ** 30]).encode()).decode()
+        response = self.client.get(reverse('customer_my_orders'), {'cursor': cursor})
+        self.assertEqual([order.order_number for order in response.context['orders']], self.newest_first[:10])
+
+    def test_vendor_and_admin_history_pages(self):
+        self.vendor.user.is_active = True
+        self.vendor.user.role = User.VENDOR
+        self.vendor.user.save()
+        self.client.login(username=self.vendor.user.email, password='abc@test')
+        pages, queries = self.walk(reverse('vendor_my_orders'), 'vendor_orders')
+        self.assertEqual(sum(pages, []), self.newest_first)
+        self.assertEqual(len(set(queries)), 1)
+
+        previous = self.client.get(reverse('vendor_my_orders'), {'cursor': self.client.get(
+            reverse('vendor_my_orders')).context['page'].next_cursor}).context['page'].previous_cursor
+        response = self.client.get(reverse('vendor_my_orders'), {'cursor': previous})
+        self.assertEqual([vendor_order.order.order_number for vendor_order in response.context['vendor_orders']],
+                         self.newest_first[:10])
+
+        admin = User.objects.create_superuser(email='admin@test.com', password='abc@test', first_name='A', last_name='A')
+        admin.role = User.ADMIN
+        admin.save()
+        self.client.login(username='admin@test.com', password='abc@test')
+        pages, queries = self.walk(reverse('admin_vendor_order_detail', args=[self.vendor.slug]), 'vendor_orders')
+        self.assertEqual(sum(pages, []), self.newest_first)
+
+
+class OrderExportTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.shop_a, self.shop_b = self.products[0].vendor, self.products[5].vendor
+        self.first = self.place_and_pay([self.products[0], self.products[5]], 'TX-1')
+        self.second = self.place_and_pay([self.products[1]], 'TX-2')
+        # placed but never paid, never exported
+        self.fill_cart([self.products[2]])
+        self.client.post(reverse('place_order'), self.order_data)
+
+    def login_vendor(self, vendor):
+        vendor.user.is_active = True
+        vendor.user.role = User.VENDOR
+        vendor.user.save()
+        self.client.login(username=vendor.user.email, password='abc@test')
+
+    def test_vendor_exports_only_their_orders_as_csv(self):
+        self.login_vendor(self.shop_a)
+        response = self.client.get(reverse('vendor_export_orders', args=['orders']))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('filename="orders-shopa.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['order_number', 'created_at', 'vendor'])
+        self.assertEqual([(row[0], row[2], row[-2]) for row in rows[1:]], [
+            (self.first.order_number, 'ShopA', '10.50'),
+            (self.second.order_number, 'ShopA', '10.50'),
+        ])
+
+    def test_admin_exports_line_items_as_jsonl(self):
+        admin = User.objects.create_superuser(email='admin@test.com', password='abc@test', first_name='A', last_name='A')
+        admin.role = User.ADMIN
+        admin.save()
+        self.client.login(username='admin@test.com', password='abc@test')
+        response = self.client.get(reverse('admin_export_orders', args=['items']), {'format': 'jsonl'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        items = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(item['order_number'], item['product'], item['quantity']) for item in items], [
+            (self.first.order_number, 'Bag 0', 1),
+            (self.first.order_number, 'Bag 0', 2),
+            (self.second.order_number, 'Bag 1', 1),
+        ])
+
+        response = self.client.get(reverse('admin_export_orders', args=['items']),
+                                   {'format': 'jsonl', 'vendor': 'shopb'})
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 1)
+
+    def test_date_range_and_bad_parameters(self):
+        self.login_vendor(self.shop_a)
+        today = timezone.localdate()
+        url = reverse('vendor_export_orders', args=['orders'])
+        response = self.client.get(url, {'from': today.isoformat(), 'to': today.isoformat()})
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 3)
+        tomorrow = (today + datetime.timedelta(days=1)).isoformat()
+        response = self.client.get(url, {'from': tomorrow})
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 1)
+        self.assertEqual(self.client.get(url, {'from': '18-10-2026'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('vendor_export_orders', args=['payments'])).status_code, 400)
+
+    def test_export_command_reads_in_chunks(self):
+        out = StringIO()
+        with self.settings(ORDER_EXPORT_CHUNK_SIZE=1):
+            call_command('export_orders', 'orders', '--vendor', 'shopb', stdout=out)
+        rows = list(csv.reader(out.getvalue().splitlines()))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual((rows[1][0], rows[1][2], rows[1][-2]), (self.first.order_number, 'ShopB', '21.00'))
+
+
+class VendorOrderStatusTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.shop_a = self.products[0].vendor
+        self.orders = [self.place_and_pay([self.products[0], self.products[5]], 'TX-%s' % i) for i in range(3)]
+        self.orders.append(self.place_and_pay([self.products[1]], 'TX-3'))
+        self.shop_a.user.is_active = True
+        self.shop_a.user.role = User.VENDOR
+        self.shop_a.user.save()
+        self.client.login(username=self.shop_a.user.email, password='abc@test')
+        OutboxEmail.objects.all().delete()
+
+    def vendor_order(self, order, vendor=None):
+        return VendorOrder.objects.get(order=order, vendor=vendor or self.shop_a)
+
+    def update(self, vendor_orders, status):
+        return self.client.post(reverse('vendor_update_order_status'), {
+            'vendor_order': [vendor_order.id for vendor_order in vendor_orders],
+            'status': status,
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+
+    def test_bulk_transition_is_one_update_and_one_insert(self):
+        vendor_orders = [self.vendor_order(order) for order in self.orders]
+        with CaptureQueriesContext(connection) as queries:
+            result = self.update(vendor_orders, 'Accepted')
+        self.assertEqual(result['updated'], [vendor_order.id for vendor_order in vendor_orders])
+        vendor_order_updates = [query for query in queries if query['sql'].startswith('UPDATE orders_vendororder')]
+        outbox_inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "accounts_outboxemail"')]
+        self.assertEqual(len(vendor_order_updates), 1)
+        self.assertEqual(len(outbox_inserts), 1)
+        self.assertEqual(OutboxEmail.objects.count(), 4)
+        self.assertEqual(OutboxEmail.objects.filter(to=['Dummy@test.com']).count(), 4)
+        self.assertIn('ShopA', OutboxEmail.objects.first().body)
+
+        # Orders ShopB also sells in wait for ShopB, the ShopA only order follows at once
+        self.assertEqual(Order.objects.get(id=self.orders[0].id).status, 'New')
+        self.assertEqual(Order.objects.get(id=self.orders[3].id).status, 'Accepted')
+        shop_b = self.products[5].vendor
+        VendorOrder.objects.transition(shop_b, [self.vendor_order(self.orders[0], shop_b).id], 'Accepted')
+        self.assertEqual(Order.objects.get(id=self.orders[0].id).status, 'Accepted')
+
+    def test_invalid_transitions_are_skipped(self):
+        first, second = self.vendor_order(self.orders[0]), self.vendor_order(self.orders[1])
+        self.update([first], 'Cancelled')
+        result = self.update([first, second], 'Completed')
+        # Cancelled is final and New must be accepted first
+        self.assertEqual(result, {'status': 'Completed', 'updated': [], 'skipped': [first.id, second.id]})
+        self.update([second], 'Accepted')
+        self.assertEqual(self.update([first, second], 'Completed')['updated'], [second.id])
+        self.assertEqual(self.vendor_order(self.orders[1]).status, 'Completed')
+        self.assertTrue(self.vendor_order(self.orders[2]).can_transition('Accepted'))
+        self.assertFalse(self.vendor_order(self.orders[1]).can_transition('Cancelled'))
+
+    def test_vendor_cannot_move_other_vendors_orders(self):
+        other = self.vendor_order(self.orders[0], self.products[5].vendor)
+        result = self.update([other], 'Accepted')
+        self.assertEqual(result['updated'], [])
+        self.assertEqual(self.vendor_order(self.orders[0], self.products[5].vendor).status, 'New')
+
+    def test_form_post_redirects_with_messages(self):
+        response = self.client.post(reverse('vendor_update_order_status'), {
+            'vendor_order': [self.vendor_order(self.orders[0]).id], 'status': 'Accepted'}, follow=True)
+        self.assertRedirects(response, reverse('vendor_my_orders'))
+        self.assertEqual([str(message) for message in get_messages(response.wsgi_request)], ['1 orders marked Accepted'])
+        response = self.client.post(reverse('vendor_update_order_status'), {'vendor_order': ['x'], 'status': 'Accepted'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('vendor_update_order_status'), {'vendor_order': ['1'], 'status': 'Shipped'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('vendor_update_order_status'), {'vendor_order': ['²'], 'status': 'Accepted'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=2)
+    def test_more_ids_than_a_page_are_rejected(self):
+        vendor_orders = [self.vendor_order(order) for order in self.orders[:3]]
+        response = self.client.post(reverse('vendor_update_order_status'), {
+            'vendor_order': [vendor_order.id for vendor_order in vendor_orders], 'status': 'Accepted'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(VendorOrder.objects.filter(status='Accepted').exists())
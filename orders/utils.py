@@ -1,7 +1,66 @@
-import datetime
+import secrets
+import threading
+import time
 
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
 
-def generate_order_number(pk):
-    current_datetime = datetime.datetime.now().strftime('%Y%m%d%H%M%S') 
-    order_number = current_datetime + str(pk)
-    return order_number
\ No newline at end of file
+
+# ULID-style numbers: milliseconds since ORDER_NUMBER_EPOCH in the high bits and
+# random bits below. Within a process the numbers increase (the low bits count up
+# inside a millisecond); across processes a clash needs two orders in the same
+# millisecond drawing close random values, and is caught by the unique index on
+# Order.order_number, see place_order.
+ORDER_NUMBER_EPOCH = 1640995200000  # 2022-01-01 UTC, in milliseconds
+RANDOM_BITS = 22
+# Keeps every number 19 digits long (until 2075), so they also sort as strings,
+# and above the 14-17 digit numbers of the previous timestamp + pk scheme
+ORDER_NUMBER_OFFSET = 3 * 10 ** 18
+
+_lock = threading.Lock()
+_last_timestamp = -1
+_last_random = 0
+
+
+def _milliseconds():
+    return time.time_ns() // 1000000 - ORDER_NUMBER_EPOCH
+
+
+def generate_order_number():
+    global _last_timestamp, _last_random
+    with _lock:
+        timestamp = _milliseconds()
+        if timestamp < _last_timestamp:
+            # The clock went back, keep counting in the last millisecond used
+            timestamp = _last_timestamp
+        if timestamp == _last_timestamp and _last_random + 1 < 1 << RANDOM_BITS:
+            low = _last_random + 1
+        else:
+            while timestamp <= _last_timestamp and _last_random + 1 >= 1 << RANDOM_BITS:
+                # The low bits of this millisecond are used up, wait for the next one
+                timestamp = _milliseconds()
+            # Start in the lower half, leaving room to count up within the millisecond
+            low = secrets.randbits(RANDOM_BITS - 1)
+        _last_timestamp, _last_random = timestamp, low
+    return str(ORDER_NUMBER_OFFSET + (timestamp << RANDOM_BITS | low))
+
+
+def rebuild_daily_revenue(daily_revenue_model, vendor_order_model):
+    """Recompute every VendorDailyRevenue row from the VendorOrder table, returns the number of rows.
+
+    Takes the models, so the migration creating the table can run it with its historical models.
+    """
+    day = TruncDate(Coalesce('order__payment__created_at', 'order__created_at'),
+                    tzinfo=timezone.get_current_timezone())
+    totals = (vendor_order_model.objects.filter(order__is_ordered=True).order_by()
+              .values_list('vendor_id', day)
+              .annotate(revenue=Sum(F('subtotal') + F('tax')), orders_count=Count('id')))
+    with transaction.atomic():
+        daily_revenue_model.objects.all().delete()
+        rows = daily_revenue_model.objects.bulk_create(
+            [daily_revenue_model(vendor_id=vendor_id, date=date, revenue=revenue, orders_count=orders_count)
+             for vendor_id, date, revenue, orders_count in totals],
+            batch_size=1000)
+    return len(rows)
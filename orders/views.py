@@ -1,48 +1,51 @@
 from urllib import response
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from marketplace.models import Cart
-from marketplace.context_processors import get_cart_amounts
+from marketplace.stores import get_cart_store
+from marketplace.utils import get_cart_pricing, reset_cart_summary
+from .exports import ExportError, export_filename, export_lines, parse_export_date
 from .forms import OrderForm
-from .models import Order, OrderedProduct, Payment
-import simplejson as json
+from .models import Order, OrderedProduct, Payment, VendorDailyRevenue, VendorOrder
 from .utils import generate_order_number
+import simplejson as json
+from accounts.outbox import queue_emails
 from accounts.utils import send_notification
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+
+
+# Attempts at inserting an order before giving up on a free order number
+ORDER_NUMBER_ATTEMPTS = 3
 
-from products.models import Product
 
+def save_new_order(order):
+    # A single INSERT, with a fresh number when two processes drew the same one
+    for attempt in range(ORDER_NUMBER_ATTEMPTS):
+        order.order_number = generate_order_number()
+        try:
+            with transaction.atomic():
+                order.save()
+            return order
+        except IntegrityError:
+            if attempt == ORDER_NUMBER_ATTEMPTS - 1:
+                raise
 
 
 @login_required(login_url='login')
 def place_order(request):
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
-    cart_count = cart_items.count()
-    if cart_count <= 0:
+    get_cart_store().flush(request.user)
+    pricing = get_cart_pricing(request)
+    if pricing.cart_count <= 0:
         return redirect('home')
 
-    vendors_ids = []
-    for i in cart_items:
-        if i.product.vendor.id not in vendors_ids:
-            vendors_ids.append(i.product.vendor.id)
-
-    subtotal = 0
-    total_data = {}
-    k = {}
-    for i in cart_items:
-        product = Product.objects.get(pk=i.product.id, vendor_id__in=vendors_ids)
-        v_id = product.vendor.id
-        if v_id in k:
-            subtotal = k[v_id]
-            subtotal += (product.price * i.quantity)
-            k[v_id] = subtotal
-        else:
-            subtotal = (product.price * i.quantity)
-            k[v_id] = subtotal
-
-        total_data.update({product.vendor.id: str(subtotal)})
-
-    grand_total = get_cart_amounts(request)['grand_total']
+    vendors_ids = pricing.vendor_ids
+    total_data = pricing.total_data()
+    grand_total = pricing.grand_total
+    reset_cart_summary(request, pricing=pricing)
 
     if request.method == 'POST':
         form = OrderForm(request.POST)
@@ -61,10 +64,14 @@ def place_order(request):
             order.total_data = json.dumps(total_data)
             order.total = grand_total
             order.payment_method = request.POST['payment_method']
-            order.save() # order id/ pk is generated
-            order.order_number = generate_order_number(order.id)
+            save_new_order(order)
             order.vendors.add(*vendors_ids)
-            order.save()
+            VendorOrder.objects.bulk_create([
+                VendorOrder(order=order, vendor_id=vendor_id, subtotal=subtotal, created_at=order.created_at)
+                for vendor_id, subtotal in pricing.vendor_subtotals.items()
+            ])
+            cart_items = list(Cart.objects.filter(user=request.user).select_related('product').order_by('created_at'))
+            reset_cart_summary(request, cart_items, pricing)
             context = {
                 'order': order,
                 'cart_items': cart_items,
@@ -73,43 +80,49 @@ def place_order(request):
     return render(request, 'orders/place_order.html')
 
 
-@login_required(login_url='login')
-def payments(request):
-        # Check if the request is ajax or not
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'POST':
-        # STORE THE PAYMENT DETAILS IN THE PAYMENT MODEL
-        order_number = request.POST.get('order_number')
-        transaction_id = request.POST.get('transaction_id')
-        payment_method = request.POST.get('payment_method')
-        status = request.POST.get('status')
-
-        order = Order.objects.get(user=request.user, order_number=order_number)
-        payment = Payment(
-            user = request.user,
-            transaction_id = transaction_id,
-            payment_method = payment_method,
-            amount = order.total,
-            status = status
+def finalize_order(request, order_number, transaction_id, payment_method, status):
+    """Record the payment, move the cart to OrderedProduct rows and queue the
+    order e-mails, as one transaction.
+
+    Returns ``(order, finalized)``. ``finalized`` is False when the order was
+    already paid, by this transaction id or another one, and nothing changed.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_related('payment').get(user=request.user, order_number=order_number)
+        if order.is_ordered:
+            return order, False
+
+        payment = Payment.objects.create(
+            user=request.user,
+            transaction_id=transaction_id,
+            payment_method=payment_method,
+            amount=order.total,
+            status=status,
         )
-        payment.save()
-
-        # UPDATE THE ORDER MODEL
+        # Compare-and-set, a concurrent request finalizing the same order updates no row
+        claimed = Order.objects.filter(pk=order.pk, is_ordered=False).update(
+            payment=payment, is_ordered=True, updated_at=timezone.now())
+        if not claimed:
+            transaction.set_rollback(True)
+            return Order.objects.select_related('payment').get(pk=order.pk), False
         order.payment = payment
         order.is_ordered = True
-        order.save()
-
-        # MOVE THE CART ITEMS TO ORDERED FOOD MODEL
-        cart_items = Cart.objects.filter(user=request.user)
-        for item in cart_items:
-            ordered_product = OrderedProduct()
-            ordered_product.order = order
-            ordered_product.payment = payment
-            ordered_product.user = request.user
-            ordered_product.product = item.product
-            ordered_product.quantity = item.quantity
-            ordered_product.price = item.product.price
-            ordered_product.amount = item.product.price * item.quantity # total amount
-            ordered_product.save()
+        VendorDailyRevenue.objects.record_order(order, timezone.localdate(payment.created_at))
+
+        cart_items = Cart.objects.filter(user=request.user).select_related('product')
+        OrderedProduct.objects.bulk_create([
+            OrderedProduct(
+                order=order,
+                payment=payment,
+                user=request.user,
+                product=item.product,
+                quantity=item.quantity,
+                price=item.product.price,
+                amount=item.product.price * item.quantity, # total amount
+            )
+            for item in cart_items
+        ])
+        Cart.objects.filter(user=request.user).delete()
 
         # SEND ORDER CONFIRMATION EMAIL TO THE CUSTOMER
         mail_subject = 'Thank you for ordering with us.'
@@ -121,22 +134,58 @@ def payments(request):
         }
         send_notification(mail_subject, mail_template, context)
 
-
         # SEND ORDER RECEIVED EMAIL TO THE VENDOR
         mail_subject = 'You have received a new order.'
         mail_template = 'orders/new_order_received.html'
-        to_emails = []
-        for i in cart_items:
-            if i.product.vendor.user.email not in to_emails:
-                to_emails.append(i.product.vendor.user.email)
+        to_emails = list(order.vendors.values_list('user__email', flat=True))
         context = {
             'order': order,
             'to_email': to_emails,
         }
         send_notification(mail_subject, mail_template, context)
+    return order, True
+
 
-        #CLEAR THE CART IF THE PAYMENT IS SUCCESS
-        cart_items.delete() 
+def transition_vendor_orders(vendor, ids, status):
+    """Move the vendor's sub-orders ``ids`` to ``status`` and tell their customers.
+
+    One UPDATE changes every sub-order the state machine allows and one INSERT
+    queues all the notifications. Returns the VendorOrders that changed.
+    """
+    with transaction.atomic():
+        changed = VendorOrder.objects.transition(vendor, ids, status)
+        vendor_orders = list(VendorOrder.objects.filter(id__in=[pk for pk, order_id in changed])
+                             .select_related('order', 'vendor').order_by('id'))
+        queue_emails([
+            ('Your order %s is %s' % (vendor_order.order.order_number, status.lower()),
+             render_to_string('orders/order_status_email.html', {'vendor_order': vendor_order}),
+             vendor_order.order.email)
+            for vendor_order in vendor_orders
+        ])
+    return vendor_orders
+
+
+@login_required(login_url='login')
+def payments(request):
+        # Check if the request is ajax or not
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'POST':
+        # STORE THE PAYMENT DETAILS IN THE PAYMENT MODEL
+        order_number = request.POST.get('order_number')
+        transaction_id = request.POST.get('transaction_id')
+        payment_method = request.POST.get('payment_method')
+        status = request.POST.get('status')
+
+        get_cart_store().flush(request.user)
+        order, finalized = finalize_order(request, order_number, transaction_id, payment_method, status)
+        if not finalized:
+            # Retried or duplicate post: the order was already paid, nothing is inserted again
+            return JsonResponse({
+                'order_number': order.order_number,
+                'transaction_id': order.payment.transaction_id if order.payment else transaction_id,
+            })
+
+        #CLEAR THE CART IF THE PAYMENT IS SUCCESS (its rows are already gone, this drops any cached copy)
+        get_cart_store().clear(request.user)
 
         # RETURN BACK TO AJAX WITH THE STATUS SUCCESS OR FAILURE
         response = {
@@ -166,4 +215,20 @@ def order_complete(request):
         }
         return render(request, 'orders/order_complete.html', context)
     except:
-        return redirect('home')
\ No newline at end of file
+        return redirect('home')
+
+
+def stream_export(request, kind, vendor=None):
+    """Stream the ``kind`` export as CSV or JSONL, filtered by the ``from``/``to`` days of the query string."""
+    export_format = request.GET.get('format', 'csv')
+    try:
+        start = parse_export_date(request.GET.get('from'))
+        end = parse_export_date(request.GET.get('to'))
+        lines = export_lines(kind, export_format, vendor, start, end)
+    except ExportError as error:
+        return HttpResponseBadRequest(str(error))
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="%s"' % export_filename(
+        kind, export_format, vendor, start, end)
+    return response
@@ -0,0 +1,229 @@
+import uuid
+
+from django.core.cache import cache
+
+from ecart.cache import cache_lock
+
+from .models import Product
+
+
+# (label, lower bound, upper bound) of the price facet, the upper bound is exclusive
+PRICE_BANDS = (
+    ('Under $100', 0, 100),
+    ('$100 to $500', 100, 500),
+    ('$500 to $1000', 500, 1000),
+    ('$1000 and above', 1000, None),
+)
+
+AVAILABILITY = (
+    ('available', 'In stock'),
+    ('unavailable', 'Out of stock'),
+)
+
+DIMENSIONS = ('category', 'vendor', 'price', 'availability')
+
+# Each (dimension, value) is cached under its own key, with its version in the VERSIONS_KEY map
+ENTRY_PREFIX = 'facet_index:entry:'
+VERSIONS_KEY = 'facet_index:versions'
+LOCK_KEY = 'facet_index:lock'
+
+
+def price_band(price):
+    for band, (label, low, high) in enumerate(PRICE_BANDS):
+        if price >= low and (high is None or price < high):
+            return band
+    return None
+
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+def bitmap_ids(bitmap):
+    # Product ids whose bit is set, highest (newest) first
+    bits = bin(bitmap)[2:]
+    top = len(bits) - 1
+    return [top - position for position, bit in enumerate(bits) if bit == '1']
+
+
+class FacetIndex:
+    """Product ids of every facet value, as bitmaps (bit n set = product n).
+
+    Filters combine the bitmaps with AND/OR instead of building SQL joins,
+    and a facet count is the popcount of an intersection.
+    """
+
+    def __init__(self):
+        # {(dimension, value): bitmap}
+        self.bitmaps = {}
+        # {(dimension, value): label} for the category and vendor facets
+        self.labels = {}
+        # Keys changed by add/discard/rename, see update_facet_index()
+        self.touched = set()
+
+    def copy(self):
+        index = FacetIndex()
+        index.bitmaps = dict(self.bitmaps)
+        index.labels = dict(self.labels)
+        return index
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        rows = Product.objects.values_list(
+            'id', 'category_id', 'category__category_name', 'vendor_id', 'vendor__shop_name',
+            'price', 'is_available')
+        for row in rows.iterator(chunk_size=2000):
+            index.add(*row)
+        return index
+
+    def add(self, product_id, category_id, category_name, vendor_id, shop_name, price, is_available):
+        bit = 1 << product_id
+        keys = [
+            ('category', category_id),
+            ('vendor', vendor_id),
+            ('price', price_band(price)),
+            ('availability', 'available' if is_available else 'unavailable'),
+        ]
+        for key in keys:
+            self.bitmaps[key] = self.bitmaps.get(key, 0) | bit
+        self.labels[('category', category_id)] = category_name
+        self.labels[('vendor', vendor_id)] = shop_name
+        self.touched.update(keys)
+
+    def add_product(self, product):
+        self.add(product.id, product.category_id, product.category.category_name, product.vendor_id,
+                 product.vendor.shop_name, product.price, product.is_available)
+
+    def discard(self, product_id):
+        bit = 1 << product_id
+        for key in list(self.bitmaps):
+            if self.bitmaps[key] & bit:
+                self.bitmaps[key] &= ~bit
+                self.touched.add(key)
+                if not self.bitmaps[key]:
+                    del self.bitmaps[key]
+                    self.labels.pop(key, None)
+
+    def _selection(self, dimension, values):
+        bitmap = 0
+        for value in values:
+            bitmap |= self.bitmaps.get((dimension, value), 0)
+        return bitmap
+
+    def _universe(self):
+        bitmap = 0
+        for (dimension, value), ids in self.bitmaps.items():
+            if dimension == 'availability':
+                bitmap |= ids
+        return bitmap
+
+    def select(self, filters, exclude=None):
+        """Bitmap of the products matching ``{dimension: [values]}``.
+
+        Values of one dimension are ORed, dimensions are ANDed.
+        """
+        bitmap = self._universe()
+        for dimension, values in filters.items():
+            if values and dimension != exclude:
+                bitmap &= self._selection(dimension, values)
+        return bitmap
+
+    def counts(self, filters):
+        """{dimension: [(value, label, count, selected)]} next to the current filters.
+
+        The counts of a dimension ignore its own selection, so picking a
+        second category shows how many products it would add.
+        """
+        facets = {dimension: [] for dimension in DIMENSIONS}
+        for dimension in DIMENSIONS:
+            base = self.select(filters, exclude=dimension)
+            selected = filters.get(dimension) or []
+            if dimension == 'price':
+                values = [(band, label) for band, (label, low, high) in enumerate(PRICE_BANDS)]
+            elif dimension == 'availability':
+                values = list(AVAILABILITY)
+            else:
+                values = sorted(
+                    ((value, self.labels.get((dimension, value), '')) for dim, value in self.bitmaps if dim == dimension),
+                    key=lambda item: str(item[1]).lower())
+            for value, label in values:
+                count = popcount(base & self.bitmaps.get((dimension, value), 0))
+                if count or value in selected:
+                    facets[dimension].append((value, label, count, value in selected))
+        return facets
+
+    def rename(self, dimension, value, label):
+        if (dimension, value) in self.labels:
+            self.labels[(dimension, value)] = label
+            self.touched.add((dimension, value))
+
+
+# The last index loaded by this process and the versions of its entries
+_local = {'versions': None, 'index': None}
+
+
+def _entry_key(key):
+    return '%s%s:%s' % (ENTRY_PREFIX, key[0], key[1])
+
+
+def get_facet_index():
+    """The shared index, only the entries changed since this process last loaded it are fetched."""
+    versions = cache.get(VERSIONS_KEY)
+    if versions is None:
+        return _store_all(FacetIndex.build())
+    if versions == _local['versions']:
+        return _local['index']
+    local_versions = _local['versions'] or {}
+    stale = [key for key, version in versions.items() if local_versions.get(key) != version]
+    entries = cache.get_many([_entry_key(key) for key in stale])
+    if len(entries) != len(stale):
+        # An entry was evicted
+        return _store_all(FacetIndex.build())
+    # A copy, requests of other threads may still be reading the previous one
+    index = _local['index'].copy() if _local['index'] is not None else FacetIndex()
+    for key in stale:
+        index.bitmaps[key], label = entries[_entry_key(key)]
+        if label is not None:
+            index.labels[key] = label
+    for key in set(local_versions) - set(versions):
+        index.bitmaps.pop(key, None)
+        index.labels.pop(key, None)
+    _local.update(versions=versions, index=index)
+    return index
+
+
+def _store_all(index):
+    index.touched = set()
+    versions = {key: uuid.uuid4().hex for key in index.bitmaps}
+    cache.set_many({_entry_key(key): (bitmap, index.labels.get(key)) for key, bitmap in index.bitmaps.items()}, None)
+    cache.set(VERSIONS_KEY, versions, None)
+    _local.update(versions=versions, index=index)
+    return index
+
+
+def update_facet_index(change):
+    """Apply ``change(index)`` to the shared index, writing only the entries it changed."""
+    with cache_lock(LOCK_KEY):
+        current = get_facet_index()
+        index = current.copy()
+        change(index)
+        versions = dict(_local['versions'])
+        entries, removed = {}, []
+        for key in index.touched:
+            if key not in index.bitmaps:
+                if versions.pop(key, None) is not None:
+                    removed.append(_entry_key(key))
+            elif (index.bitmaps[key], index.labels.get(key)) != (current.bitmaps.get(key), current.labels.get(key)):
+                entries[_entry_key(key)] = (index.bitmaps[key], index.labels.get(key))
+                versions[key] = uuid.uuid4().hex
+        index.touched = set()
+        # Entries first, a process seeing the new versions finds them
+        cache.set_many(entries, None)
+        cache.set(VERSIONS_KEY, versions, None)
+        cache.delete_many(removed)
+        _local.update(versions=versions, index=index)
+
+
+def rebuild_facet_index():
+    return _store_all(FacetIndex.build())
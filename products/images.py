@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from ecart.cache import invalidate_tags, product_tags
+
+
+# Widths of the derivatives, each is rendered as WebP and in the source format
+THUMBNAIL_WIDTHS = (80, 320, 640)
+
+DERIVATIVES_DIR = 'productimages/derivatives'
+
+WEBP_QUALITY = 80
+
+
+def fallback_extension(name):
+    # PNGs keep their transparency, everything else becomes a JPEG
+    return 'png' if name.lower().endswith('.png') else 'jpg'
+
+
+def derivative_name(product_id, name, width, extension):
+    # Per product, two images with the same file name in different places do not share derivatives
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return '%s/%s/%s_%d.%s' % (DERIVATIVES_DIR, product_id, stem, width, extension)
+
+
+def _store(name, image, *args, **kwargs):
+    content = BytesIO()
+    image.save(content, *args, **kwargs)
+    # Re-rendering replaces the file, storage.save() would pick another name
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(content.getvalue()))
+
+
+def render_derivatives(product_id, name):
+    """Write every derivative of the image ``name`` through the default storage, runs in a worker process."""
+    extension = fallback_extension(name)
+    with default_storage.open(name) as file, Image.open(file) as source:
+        source = ImageOps.exif_transpose(source)
+        if extension == 'jpg' and source.mode not in ('RGB', 'L'):
+            source = source.convert('RGB')
+        for width in THUMBNAIL_WIDTHS:
+            image = source.copy()
+            image.thumbnail((width, width), Image.LANCZOS)
+            _store(derivative_name(product_id, name, width, 'webp'), image, 'WEBP', quality=WEBP_QUALITY, method=4)
+            if extension == 'jpg':
+                _store(derivative_name(product_id, name, width, 'jpg'), image, 'JPEG',
+                       quality=85, optimize=True, progressive=True)
+            else:
+                _store(derivative_name(product_id, name, width, 'png'), image, 'PNG', optimize=True)
+    return name
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.PRODUCT_IMAGE_WORKERS)
+    return _executor
+
+
+def mark_thumbnails_ready(product_id, name):
+    from .models import Product
+
+    # The image may have been replaced while its derivatives were rendered
+    product = Product.objects.filter(pk=product_id, image=name).only('category_id', 'vendor_id').first()
+    if product is not None:
+        Product.objects.filter(pk=product_id, image=name).update(thumbnails_ready=True)
+        # update() sends no post_save, the cached catalog pages still have the old image URLs
+        invalidate_tags('catalog', *product_tags(product))
+
+
+def _rendered(product_id, future):
+    # Runs on the executor's management thread, which has its own connection
+    try:
+        if future.exception() is None:
+            mark_thumbnails_ready(product_id, future.result())
+    finally:
+        connections.close_all()
+
+
+def process_product_image(product):
+    """Render the derivatives of ``product.image`` once the save is committed.
+
+    With ``PRODUCT_IMAGE_WORKERS = 0`` they are rendered in the request.
+    """
+    if not product.image:
+        return
+    product_id, name = product.pk, product.image.name
+
+    def submit():
+        if not settings.PRODUCT_IMAGE_WORKERS:
+            render_derivatives(product_id, name)
+            mark_thumbnails_ready(product_id, name)
+            return
+        future = get_executor().submit(render_derivatives, product_id, name)
+        future.add_done_callback(lambda future: _rendered(product_id, future))
+    transaction.on_commit(submit)
@@ -0,0 +1,69 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User, UserProfile
+from products.models import Category, Product
+from products.search import rebuild_index, search_products
+from vendor.models import Vendor
+
+
+WORDS = (
+    'leather canvas cotton denim wool silk linen suede nylon velvet bag shoe sneaker boot sandal '
+    'jacket shirt dress skirt scarf hat belt wallet watch ring necklace bracelet lamp chair table '
+    'mug bottle plate bowl knife spoon pillow blanket towel rug candle frame mirror clock phone '
+    'case charger cable speaker headphone keyboard mouse notebook pen pencil marker backpack '
+    'red blue green black white brown grey pink yellow orange purple navy beige classic vintage '
+    'modern casual formal sport travel summer winter premium organic handmade slim large small'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Time full-text product search on a generated catalog (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with transaction.atomic():
+            self.create_catalog(rng, options['products'])
+
+            start = time.perf_counter()
+            rebuild_index()
+            self.stdout.write('Indexed %d products in %.2fs' % (options['products'], time.perf_counter() - start))
+
+            queries = [' '.join(rng.sample(WORDS, rng.choice((1, 2)))) for _ in range(options['queries'])]
+            self.report('FTS5 bm25', [self.time(lambda: search_products(query)) for query in queries])
+
+            transaction.set_rollback(True)
+
+    def time(self, run):
+        start = time.perf_counter()
+        run()
+        return (time.perf_counter() - start) * 1000
+
+    def report(self, label, timings):
+        timings.sort()
+        self.stdout.write('%s: %d queries, median %.2fms, p95 %.2fms' % (
+            label, len(timings), statistics.median(timings), timings[int(len(timings) * 0.95) - 1]))
+
+    def create_catalog(self, rng, size):
+        user = User.objects.create_user(first_name='Bench', last_name='Vendor', email='bench-search@example.com')
+        vendor = Vendor.objects.create(
+            user=user, user_profile=UserProfile.objects.get(user=user), shop_name='Bench Store', slug='bench-search')
+        categories = Category.objects.bulk_create([
+            Category(vendor=vendor, category_name=word.capitalize(), slug='bench-search-%s' % word)
+            for word in WORDS[:40]
+        ])
+        Product.objects.bulk_create((
+            Product(vendor=vendor, category=rng.choice(categories),
+                    title=' '.join(rng.sample(WORDS, 2))[:20], slug='bench-search-%s' % i,
+                    description=' '.join(rng.sample(WORDS, 12)), price=rng.randint(1, 5000),
+                    image='productimages/casual.jpeg')
+            for i in range(size)
+        ), batch_size=2000)
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from ecart.cache import invalidate_tags, product_tags
+from products.images import render_derivatives
+from products.models import Product
+from products.search import chunked
+
+
+class Command(BaseCommand):
+    help = 'Render the thumbnails and WebP variants of existing product images in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+        parser.add_argument('--all', action='store_true', help='Also re-render products that have thumbnails')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='')
+        if not options['all']:
+            products = products.filter(thumbnails_ready=False)
+        images = []
+        for product_id, name in products.values_list('id', 'image'):
+            if default_storage.exists(name):
+                images.append((product_id, name))
+            else:
+                self.stderr.write('Missing image %s' % name)
+
+        rendered = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {(product_id, name): executor.submit(render_derivatives, product_id, name)
+                       for product_id, name in images}
+            for (product_id, name), future in futures.items():
+                try:
+                    future.result()
+                except Exception as error:
+                    self.stderr.write('Could not render %s: %s' % (name, error))
+                else:
+                    rendered.append(product_id)
+
+        tags = {'catalog'}
+        for chunk in chunked(rendered, 500):
+            Product.objects.filter(id__in=chunk).update(thumbnails_ready=True)
+            for product in Product.objects.filter(id__in=chunk).only('category_id', 'vendor_id'):
+                tags.update(product_tags(product))
+        # update() sends no post_save, the cached catalog pages still have the old image URLs
+        invalidate_tags(*tags)
+        self.stdout.write(self.style.SUCCESS(
+            'Rendered the images of %d products, %d failed' % (len(rendered), len(images) - len(rendered))))
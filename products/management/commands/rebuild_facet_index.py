@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.facets import popcount, rebuild_facet_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached catalog facet index'
+
+    def handle(self, *args, **options):
+        index = rebuild_facet_index()
+        self.stdout.write(self.style.SUCCESS('Indexed %d products' % popcount(index.select({}))))
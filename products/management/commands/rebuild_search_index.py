@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Indexed %d products' % Product.objects.count()))
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.1 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_auto_20220914_0718'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_available', 'created_at', 'id'], name='product_catalog_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    from products.search import CREATE_SEARCH_TABLE
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(CREATE_SEARCH_TABLE)
+        # Index the products that already exist
+        schema_editor.execute(
+            'INSERT INTO products_product_search (rowid, title, description, category_name, shop_name) '
+            'SELECT p.id, p.title, p.description, c.category_name, v.shop_name FROM products_product p '
+            'JOIN products_category c ON c.id = p.category_id JOIN vendor_vendor v ON v.id = p.vendor_id')
+
+
+def drop_search_table(apps, schema_editor):
+    from products.search import DROP_SEARCH_TABLE
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_SEARCH_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_catalog_idx'),
+        ('vendor', '0004_auto_20220913_1543'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.1 on 2026-10-18 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -2,6 +2,8 @@ from tabnanny import verbose
 from django.db import models
 
 from vendor.models import Vendor
+
+from .images import THUMBNAIL_WIDTHS, derivative_name, fallback_extension
 # Create your models here.
 
 class Category(models.Model):
@@ -32,10 +34,41 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10,decimal_places=2)
     image =  models.ImageField(upload_to = 'productimages')
     is_available = models.BooleanField(default=True)
+    # set once the thumbnails of the current image are rendered (products.images)
+    thumbnails_ready = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of the catalog: is_available filter, newest first
+            models.Index(fields=['is_available', 'created_at', 'id'], name='product_catalog_idx'),
+        ]
+
     def __str__(self):
         return str(self.title)
-    
+
+    def thumbnail_url(self, width):
+        if not self.thumbnails_ready:
+            return self.image.url
+        return self.image.storage.url(derivative_name(self.pk, self.image.name, width, fallback_extension(self.image.name)))
+
+    def _srcset(self, extension):
+        if not self.thumbnails_ready:
+            return ''
+        return ', '.join('%s %dw' % (self.image.storage.url(derivative_name(self.pk, self.image.name, width, extension)), width)
+                         for width in THUMBNAIL_WIDTHS)
+
+    @property
+    def image_thumbnail(self):
+        return self.thumbnail_url(80)
+
+    @property
+    def image_srcset(self):
+        return self._srcset(fallback_extension(self.image.name))
+
+    @property
+    def image_webp_srcset(self):
+        return self._srcset('webp')
+
     
\ No newline at end of file
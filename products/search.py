@@ -0,0 +1,111 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+
+# FTS5 table holding one row per product, its rowid is the product id
+SEARCH_TABLE = 'products_product_search'
+
+# bm25 weights of the indexed columns: title, description, category, shop
+SEARCH_WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+
+CREATE_SEARCH_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5('
+    'title, description, category_name, shop_name, '
+    "tokenize = 'porter unicode61 remove_diacritics 2')" % SEARCH_TABLE
+)
+DROP_SEARCH_TABLE = 'DROP TABLE IF EXISTS %s' % SEARCH_TABLE
+
+
+def search_enabled():
+    # Other databases fall back to a plain icontains search
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(query):
+    # Every word must match, the last one as a prefix for search-as-you-type
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    terms = ['"%s"' % word for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_products(products):
+    """(Re)index the given queryset of products."""
+    if not search_enabled():
+        return
+    rows = products.values_list('id', 'title', 'description', 'category__category_name', 'vendor__shop_name')
+    with connection.cursor() as cursor:
+        for chunk in chunked(rows.iterator(chunk_size=2000), 2000):
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % SEARCH_TABLE, [(row[0],) for row in chunk])
+            cursor.executemany(
+                'INSERT INTO %s (rowid, title, description, category_name, shop_name) '
+                'VALUES (%%s, %%s, %%s, %%s, %%s)' % SEARCH_TABLE, chunk)
+
+
+def remove_product(product_id):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid = %%s' % SEARCH_TABLE, [product_id])
+
+
+def rebuild_index():
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % SEARCH_TABLE)
+    index_products(Product.objects.all())
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO %s (%s) VALUES ('optimize')" % (SEARCH_TABLE, SEARCH_TABLE))
+
+
+def search_products(query, page=1, per_page=24):
+    """Available products matching ``query``, best bm25 rank first.
+
+    Returns ``(products, has_next)`` for the requested page.
+    """
+    offset = (page - 1) * per_page
+    if search_enabled():
+        match = build_match_query(query)
+        if not match:
+            return [], False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT s.rowid FROM %s s JOIN %s p ON p.id = s.rowid '
+                'WHERE %s MATCH %%s AND p.is_available '
+                'ORDER BY bm25(%s, %s) LIMIT %%s OFFSET %%s' % (
+                    SEARCH_TABLE, Product._meta.db_table, SEARCH_TABLE, SEARCH_TABLE,
+                    ', '.join(str(weight) for weight in SEARCH_WEIGHTS)),
+                [match, per_page + 1, offset])
+            ids = [row[0] for row in cursor.fetchall()]
+    else:
+        lookup = Q()
+        for word in re.findall(r'\w+', query):
+            lookup &= (Q(title__icontains=word) | Q(description__icontains=word)
+                       | Q(category__category_name__icontains=word) | Q(vendor__shop_name__icontains=word))
+        if not lookup:
+            return [], False
+        ids = list(Product.objects.filter(lookup, is_available=True)
+                   .order_by('-created_at', '-id').values_list('id', flat=True)[offset:offset + per_page + 1])
+
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    products = Product.objects.select_related('vendor', 'category').in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products], has_next
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ecart.cache import invalidate_tags, product_tags
+from vendor.models import Vendor
+
+from . import facets, search
+from .models import Category, Product
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    # The category name is indexed with each of its products
+    if not created and not raw:
+        search.index_products(Product.objects.filter(category=instance))
+
+
+def shop_name_changed(vendor, update_fields):
+    if update_fields is not None and 'shop_name' not in update_fields:
+        return False
+    return getattr(vendor, 'shop_name_changed', True)
+
+
+@receiver(post_save, sender=Vendor)
+def reindex_vendor_products(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # The shop name is indexed with each of the vendor's products, approvals and licenses are not
+    if not created and not raw and shop_name_changed(instance, update_fields):
+        search.index_products(Product.objects.filter(vendor=instance))
+
+
+# The facet index lives in the cache, so it is only updated once the change is committed
+
+@receiver(post_save, sender=Product)
+def update_product_facets(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    def change(index):
+        index.discard(instance.pk)
+        index.add_product(instance)
+    transaction.on_commit(lambda: facets.update_facet_index(change))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_facets(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: facets.update_facet_index(lambda index: index.discard(product_id)))
+
+
+@receiver(post_save, sender=Category)
+def rename_category_facet(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        transaction.on_commit(lambda: facets.update_facet_index(
+            lambda index: index.rename('category', instance.pk, instance.category_name)))
+
+
+@receiver(post_save, sender=Vendor)
+def rename_vendor_facet(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not created and not raw and shop_name_changed(instance, update_fields):
+        transaction.on_commit(lambda: facets.update_facet_index(
+            lambda index: index.rename('vendor', instance.pk, instance.shop_name)))
+
+
+# Tags of the cached catalog reads (ecart.cache) affected by each change
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_caches(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_tags('catalog', *product_tags(instance))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_caches(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_tags('category:%s' % instance.pk, 'vendor:%s' % instance.vendor_id)
+
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_delete, sender=Vendor)
+def invalidate_vendor_caches(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_tags('vendor:%s' % instance.pk)
@@ -1,3 +1,382 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from accounts.models import User, UserProfile
+from ecart.cache import cache_stats, cached, invalidate_tags
+from ecart.pagination import decode_cursor, encode_cursor, keyset_paginate
+from ecart.views import CATALOG_PAGE_SIZE
+from products import facets
+from products.facets import bitmap_ids, get_facet_index
+from products.images import THUMBNAIL_WIDTHS, derivative_name, mark_thumbnails_ready, process_product_image
+from products.models import Category, Product
+from products.search import search_products
+from vendor.models import Vendor
+
+
+class CatalogTestMixin:
+    def create_catalog(self, size):
+        # bulk_create sends no signals, so nothing would invalidate cached catalog reads
+        cache.clear()
+        user = User.objects.create_user(
+            email='DummyShop@test.com', password='abc@test', first_name='Dummy', last_name='Dummy')
+        self.vendor = Vendor.objects.create(
+            user=user, user_profile=UserProfile.objects.get(user=user), shop_name='DummyShop', slug='dummyshop')
+        self.category = Category.objects.create(vendor=self.vendor, category_name='Bag', slug='bag')
+        Product.objects.bulk_create([
+            Product(vendor=self.vendor, category=self.category, title='Bag %s' % i, slug='bag-%s' % i,
+                    price=100 + i, image='productimages/casual.jpeg')
+            for i in range(size)
+        ])
+
+
+class CatalogPaginationTest(CatalogTestMixin, TestCase):
+    def setUp(self):
+        self.create_catalog(CATALOG_PAGE_SIZE + 6)
+
+    def test_home_shows_first_page_newest_first(self):
+        response = self.client.get(reverse('home'))
+        products = response.context['products']
+        self.assertEqual(len(products), CATALOG_PAGE_SIZE)
+        self.assertEqual(products[0], Product.objects.latest('created_at', 'id'))
+        self.assertTrue(response.context['page'].has_next)
+
+    def test_catalog_fragment_continues_after_cursor(self):
+        first = self.client.get(reverse('home')).context['page']
+        response = self.client.get(reverse('home_catalog'), {'cursor': first.next_cursor})
+        self.assertTemplateUsed(response, 'includes/product_cards.html')
+        self.assertEqual(len(response.context['products']), 6)
+        self.assertEqual(response['X-Next-Cursor'], '')
+        seen = {product.id for product in first.items} | {product.id for product in response.context['products']}
+        self.assertEqual(seen, set(Product.objects.values_list('id', flat=True)))
+
+    def test_catalog_queries_do_not_grow_with_page_size(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('home_catalog'))
+        self.assertEqual(len(queries), 1)
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.client.get(reverse('home_catalog'), {'cursor': 'garbage'})
+        self.assertEqual(len(response.context['products']), CATALOG_PAGE_SIZE)
+
+    def test_forged_cursors_return_first_page(self):
+        def forge(value, pk):
+            return base64.urlsafe_b64encode(json.dumps(['next', value, pk]).encode()).decode()
+        aware, naive = '2026-01-01T00:00:00+00:00', '2026-01-01T00:00:00'
+        for cursor in (forge(aware, 10 ** 30), forge(aware, True), forge(aware, 0), forge(naive, 1)):
+            self.assertEqual(decode_cursor(cursor), (None, None, None))
+            for name in ('home', 'home_catalog'):
+                response = self.client.get(reverse(name), {'cursor': cursor})
+                self.assertEqual(len(response.context['products']), CATALOG_PAGE_SIZE)
+        self.assertEqual(decode_cursor(forge(aware, 5))[2], 5)
+
+    def test_previous_cursor_returns_previous_page(self):
+        products = Product.objects.all()
+        first = keyset_paginate(products, per_page=10)
+        second = keyset_paginate(products, first.next_cursor, per_page=10)
+        back = keyset_paginate(products, second.previous_cursor, per_page=10)
+        self.assertEqual(back.items, first.items)
+        self.assertFalse(back.has_previous)
+        self.assertTrue(back.has_next)
+
+
+class ProductSearchTest(CatalogTestMixin, TestCase):
+    def setUp(self):
+        self.create_catalog(0)
+        self.leather = Product.objects.create(
+            vendor=self.vendor, category=self.category, title='Leather Bag', slug='leather-bag',
+            description='Brown handmade tote', price=900, image='productimages/casual.jpeg')
+        self.canvas = Product.objects.create(
+            vendor=self.vendor, category=self.category, title='Canvas Tote', slug='canvas-tote',
+            description='Light bag with leather straps', price=300, image='productimages/casual.jpeg')
+
+    def search(self, query):
+        return search_products(query)[0]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('leather'), [self.leather, self.canvas])
+
+    def test_prefix_and_category_and_shop_match(self):
+        self.assertEqual(self.search('hand'), [self.leather])
+        self.assertEqual(len(self.search('bag')), 2)
+        self.assertEqual(len(self.search('dummyshop')), 2)
+
+    def test_index_follows_product_changes(self):
+        self.canvas.title = 'Canvas Backpack'
+        self.canvas.save()
+        self.assertEqual(self.search('backpack'), [self.canvas])
+        self.leather.delete()
+        self.assertEqual(self.search('leather'), [self.canvas])
+
+    def test_index_follows_category_rename(self):
+        self.category.category_name = 'Luggage'
+        self.category.save()
+        self.assertEqual(len(self.search('luggage')), 2)
+
+    def test_only_shop_renames_reindex_vendor_products(self):
+        with patch('products.signals.search.index_products') as index_products:
+            self.vendor.is_approved = True
+            self.vendor.save()
+            self.vendor.save(update_fields=['is_approved'])
+        index_products.assert_not_called()
+        self.vendor.shop_name = 'Tote Works'
+        self.vendor.save()
+        self.assertEqual(len(self.search('works')), 2)
+
+    def test_unavailable_products_are_hidden(self):
+        self.canvas.is_available = False
+        self.canvas.save()
+        self.assertEqual(self.search('leather'), [self.leather])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('search'), {'q': 'canvas "tote'})
+        self.assertEqual(list(response.context['products']), [self.canvas])
+        self.assertFalse(response.context['has_next'])
+
+    def test_search_view_refuses_deep_pages(self):
+        response = self.client.get(reverse('search'), {'q': 'bag', 'page': '99999999999999999999'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('search'), {'q': 'bag', 'page': '100'})
+        self.assertEqual(response.status_code, 200)
+
+
+class FacetFilterTest(CatalogTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_catalog(0)
+        self.shoes = Category.objects.create(vendor=self.vendor, category_name='Shoes', slug='shoes')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cheap_bag = self.create_product('Cheap Bag', self.category, 50)
+            self.bag = self.create_product('Bag', self.category, 300)
+            self.shoe = self.create_product('Shoe', self.shoes, 300)
+            self.sold_out = self.create_product('Sold Out Shoe', self.shoes, 700, is_available=False)
+
+    def create_product(self, title, category, price, is_available=True):
+        return Product.objects.create(
+            vendor=self.vendor, category=category, title=title, slug=title.lower().replace(' ', '-'),
+            price=price, is_available=is_available, image='productimages/casual.jpeg')
+
+    def select(self, **filters):
+        return set(bitmap_ids(get_facet_index().select(filters)))
+
+    def test_filters_intersect_across_dimensions(self):
+        self.assertEqual(self.select(category=[self.shoes.id]), {self.shoe.id, self.sold_out.id})
+        self.assertEqual(self.select(category=[self.shoes.id], availability=['available']), {self.shoe.id})
+        self.assertEqual(self.select(price=[1]), {self.bag.id, self.shoe.id})
+        self.assertEqual(self.select(price=[0, 2]), {self.cheap_bag.id, self.sold_out.id})
+
+    def test_counts_ignore_own_dimension(self):
+        facets = get_facet_index().counts({'category': [self.shoes.id]})
+        self.assertEqual(facets['category'], [
+            (self.category.id, 'Bag', 2, False),
+            (self.shoes.id, 'Shoes', 2, True),
+        ])
+        self.assertEqual(facets['availability'], [
+            ('available', 'In stock', 1, False),
+            ('unavailable', 'Out of stock', 1, False),
+        ])
+
+    def test_index_follows_product_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bag.price = 1500
+            self.bag.save()
+            self.cheap_bag.delete()
+        self.assertEqual(self.select(price=[3]), {self.bag.id})
+        self.assertEqual(self.select(category=[self.category.id]), {self.bag.id})
+
+    def test_index_follows_category_rename(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoes.category_name = 'Sneakers'
+            self.shoes.save()
+        labels = [label for value, label, count, selected in get_facet_index().counts({})['category']]
+        self.assertEqual(labels, ['Bag', 'Sneakers'])
+
+    def test_index_is_rebuilt_after_cache_loss(self):
+        cache.clear()
+        self.assertEqual(self.select(), {self.cheap_bag.id, self.bag.id, self.shoe.id, self.sold_out.id})
+
+    def test_update_writes_only_changed_entries(self):
+        get_facet_index()
+        with patch('products.facets.cache', wraps=cache) as facet_cache:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.bag.price = 1500
+                self.bag.save()
+        written = facet_cache.set_many.call_args.args[0]
+        # The bag leaves the $100 to $500 band for $1000 and above, nothing else changed
+        self.assertEqual(sorted(written), ['facet_index:entry:price:1', 'facet_index:entry:price:3'])
+        self.assertEqual(self.select(price=[3]), {self.bag.id})
+
+    def test_other_process_fetches_only_changed_entries(self):
+        get_facet_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoes.category_name = 'Sneakers'
+            self.shoes.save()
+        # Another process still holds the index from before the rename
+        facets._local['versions'] = {**facets._local['versions'], ('category', self.shoes.id): 'old'}
+        with patch('products.facets.cache', wraps=cache) as facet_cache:
+            labels = [label for value, label, count, selected in get_facet_index().counts({})['category']]
+        self.assertEqual(facet_cache.get_many.call_args.args[0], ['facet_index:entry:category:%s' % self.shoes.id])
+        self.assertEqual(labels, ['Bag', 'Sneakers'])
+
+    def test_malformed_numbers_are_ignored(self):
+        response = self.client.get(reverse('filter_products'), {'category': ['²', 'x', str(self.shoes.id)]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['products'], [self.shoe])
+
+    def test_filter_view_hides_unavailable_products_unless_asked(self):
+        response = self.client.get(reverse('filter_products'))
+        self.assertEqual(set(response.context['products']), {self.cheap_bag, self.bag, self.shoe})
+        response = self.client.get(reverse('filter_products'), {'availability': 'unavailable'})
+        self.assertEqual(response.context['products'], [self.sold_out])
+        response = self.client.get(reverse('filter_products'), {'availability': ['available', 'unavailable']})
+        self.assertEqual(response.context['total'], 4)
+
+    def test_filter_view_uses_no_count_queries(self):
+        get_facet_index()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('filter_products'), {'category': self.shoes.id, 'price': 1})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.context['products'], [self.shoe])
+        self.assertEqual(response.context['total'], 1)
+
+
+@override_settings(PRODUCT_IMAGE_WORKERS=0)
+class ProductImageTest(CatalogTestMixin, TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+
+        self.create_catalog(0)
+        upload = BytesIO()
+        Image.new('RGB', (1200, 900), 'red').save(upload, 'JPEG')
+        self.product = Product.objects.create(
+            vendor=self.vendor, category=self.category, title='Red Bag', slug='red-bag', price=100,
+            image=SimpleUploadedFile('red.jpeg', upload.getvalue(), content_type='image/jpeg'))
+
+    def test_derivatives_are_rendered_after_commit(self):
+        self.assertEqual(self.product.image_srcset, '')
+        self.assertEqual(self.product.image_thumbnail, self.product.image.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            process_product_image(self.product)
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.thumbnails_ready)
+        for width in THUMBNAIL_WIDTHS:
+            for extension in ('webp', 'jpg'):
+                with Image.open(os.path.join(self.media_root, derivative_name(self.product.pk, self.product.image.name, width, extension))) as image:
+                    self.assertEqual(image.size, (width, width * 3 // 4))
+        self.assertIn('_640.webp 640w', self.product.image_webp_srcset)
+        self.assertTrue(self.product.image_thumbnail.endswith('_80.jpg'))
+
+    def test_images_with_the_same_file_name_keep_their_own_derivatives(self):
+        upload = BytesIO()
+        Image.new('RGB', (400, 400), 'blue').save(upload, 'JPEG')
+        name = default_storage.save('elsewhere/%s' % os.path.basename(self.product.image.name),
+                                    ContentFile(upload.getvalue()))
+        other = Product.objects.create(vendor=self.vendor, category=self.category, title='Blue Bag',
+                                       slug='blue-bag', price=100, image=name)
+        with self.captureOnCommitCallbacks(execute=True):
+            process_product_image(self.product)
+            process_product_image(other)
+        for product, size in ((self.product, (320, 240)), (other, (320, 320))):
+            with default_storage.open(derivative_name(product.pk, product.image.name, 320, 'jpg')) as file:
+                with Image.open(file) as image:
+                    self.assertEqual(image.size, size)
+
+    def test_cached_catalog_shows_rendered_thumbnails(self):
+        self.assertFalse(self.client.get(reverse('home')).context['products'][0].thumbnails_ready)
+        with self.captureOnCommitCallbacks(execute=True):
+            process_product_image(self.product)
+        response = self.client.get(reverse('home'))
+        self.assertTrue(response.context['products'][0].thumbnails_ready)
+        self.assertContains(response, '_640.webp 640w')
+
+        Product.objects.update(thumbnails_ready=False)
+        invalidate_tags('catalog')
+        self.assertFalse(self.client.get(reverse('home')).context['products'][0].thumbnails_ready)
+        call_command('build_product_thumbnails', workers=1, stdout=StringIO())
+        self.assertTrue(self.client.get(reverse('home')).context['products'][0].thumbnails_ready)
+
+    def test_replaced_image_is_not_marked_ready(self):
+        name = self.product.image.name
+        Product.objects.filter(pk=self.product.pk).update(image='productimages/other.jpeg')
+        mark_thumbnails_ready(self.product.pk, name)
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.thumbnails_ready)
+
+    def test_backfill_command_renders_in_parallel(self):
+        call_command('build_product_thumbnails', workers=2, stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.thumbnails_ready)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.media_root, derivative_name(self.product.pk, self.product.image.name, 320, 'webp'))))
+
+
+class CatalogCacheTest(CatalogTestMixin, TestCase):
+    def setUp(self):
+        self.create_catalog(3)
+        self.product = Product.objects.latest('created_at', 'id')
+
+    def test_catalog_page_is_served_from_cache(self):
+        self.client.get(reverse('home_catalog'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home_catalog'))
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(len(response.context['products']), 3)
+        self.assertEqual(cache_stats()['catalog'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_only_the_first_page_is_cached(self):
+        self.client.get(reverse('home_catalog'))
+        cursor = encode_cursor('next', self.product.created_at, self.product.pk)
+        self.client.get(reverse('home_catalog'), {'cursor': cursor})
+        self.client.get(reverse('home_catalog'), {'cursor': cursor})
+        self.assertEqual(cache_stats()['catalog'], {'hits': 0, 'misses': 1, 'hit_rate': 0})
+
+    def test_product_change_invalidates_catalog(self):
+        self.client.get(reverse('home_catalog'))
+        self.product.is_available = False
+        self.product.save()
+        response = self.client.get(reverse('home_catalog'))
+        self.assertEqual(len(response.context['products']), 2)
+
+    def test_vendor_rename_invalidates_catalog(self):
+        self.client.get(reverse('home_catalog'))
+        self.vendor.shop_name = 'Renamed'
+        self.vendor.save()
+        response = self.client.get(reverse('home_catalog'))
+        self.assertEqual(response.context['products'][0].vendor.shop_name, 'Renamed')
+
+    def test_invalidation_during_compute_is_not_lost(self):
+        def compute():
+            # Another request changes a product while this one renders the stale rows
+            invalidate_tags('catalog')
+            return 'stale'
+        self.assertEqual(cached('catalog:test', compute, ['catalog'], value_tags=lambda value: ['vendor:0']), 'stale')
+        self.assertEqual(cached('catalog:test', lambda: 'fresh', ['catalog']), 'fresh')
+
+    def test_only_affected_tags_are_invalidated(self):
+        other = cached('storefront:other', lambda: 'other', ['vendor:0'])
+        self.assertEqual(other, 'other')
+        self.product.save()
+        self.assertEqual(cached('storefront:other', lambda: 'recomputed', ['vendor:0']), 'other')
+        self.assertEqual(cached('storefront:mine', lambda: 'mine', ['vendor:%s' % self.vendor.id]), 'mine')
+        Category.objects.create(vendor=self.vendor, category_name='Shoes', slug='shoes')
+        self.assertEqual(cached('storefront:mine', lambda: 'recomputed', ['vendor:%s' % self.vendor.id]), 'recomputed')
@@ -1,3 +1,82 @@
+from django.http import Http404
 from django.shortcuts import render
+from django.views.decorators.csrf import ensure_csrf_cookie
 
-# Create your views here.
+from .facets import DIMENSIONS, bitmap_ids, get_facet_index
+from .models import Product
+from .search import search_products
+
+
+SEARCH_PAGE_SIZE = 24
+# Deeper pages are not served, the OFFSET would grow without bound
+SEARCH_MAX_PAGE = 100
+FILTER_PAGE_SIZE = 24
+FACET_TITLES = {'category': 'Category', 'vendor': 'Shop', 'price': 'Price', 'availability': 'Availability'}
+
+
+@ensure_csrf_cookie
+def search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    if page > SEARCH_MAX_PAGE:
+        raise Http404('No such page')
+    products, has_next = search_products(query, page, SEARCH_PAGE_SIZE) if query else ([], False)
+    context = {
+        'query': query,
+        'products': products,
+        'page_number': page,
+        'has_next': has_next,
+    }
+    return render(request, 'products/search.html', context)
+
+
+def parse_facet_filters(query):
+    # ?category=1&category=2&price=0&availability=available
+    filters = {}
+    for dimension in DIMENSIONS:
+        values = query.getlist(dimension)
+        if dimension != 'availability':
+            numbers = []
+            for value in values:
+                try:
+                    numbers.append(int(value))
+                except ValueError:
+                    pass
+            values = numbers
+        if values:
+            filters[dimension] = values
+    # Like search and the home catalog, sold out products only show up when asked for
+    filters.setdefault('availability', ['available'])
+    return filters
+
+
+@ensure_csrf_cookie
+def filter_products(request):
+    filters = parse_facet_filters(request.GET)
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    if page > SEARCH_MAX_PAGE:
+        raise Http404('No such page')
+    index = get_facet_index()
+    ids = bitmap_ids(index.select(filters))
+    offset = (page - 1) * FILTER_PAGE_SIZE
+    page_ids = ids[offset:offset + FILTER_PAGE_SIZE]
+    products = Product.objects.select_related('vendor', 'category').in_bulk(page_ids)
+
+    facets = index.counts(filters)
+    query = request.GET.copy()
+    query.pop('page', None)
+    context = {
+        'products': [products[product_id] for product_id in page_ids if product_id in products],
+        'facets': [(dimension, FACET_TITLES[dimension], facets[dimension]) for dimension in DIMENSIONS],
+        'total': len(ids),
+        'page_number': page,
+        'has_next': len(ids) > offset + FILTER_PAGE_SIZE,
+        'query_string': query.urlencode(),
+    }
+    return render(request, 'products/filter.html', context)
@@ -73,38 +73,10 @@ function onPlaceChanged (){
 
 
 $(document).ready(function(){
-    // add to cart
-    $('.add_to_cart').on('click', function(e){
+    // add to cart (delegated, catalog cards are also appended by infinite scroll)
+    $(document).on('click', '.add_to_cart', function(e){
         e.preventDefault();
-        
-        product_id = $(this).attr('data-id');
-        url = $(this).attr('data-url');
-        
-       
-        $.ajax({
-            type: 'GET',
-            url: url,
-            success: function(response){
-                console.log(response)
-                if(response.status == 'login_required'){
-                    swal(response.message, '', 'info').then(function(){
-                        window.location = '/account/login';
-                    })
-                }else if(response.status == 'Failed'){
-                    swal(response.message, '', 'error')
-                }else{
-                    $('#cart_counter').html(response.cart_counter['cart_count']);
-                    $('#qty-'+product_id).html(response.qty);
-
-                    // subtotal, tax and grand total
-                    applyCartAmounts(
-                        response.cart_amount['subtotal'],
-                        response.cart_amount['tax_dict'],
-                        response.cart_amount['grand_total']
-                    )
-                }
-            }
-        })
+        queueCartDelta($(this).attr('data-id'), 1);
     })
 
 
@@ -116,28 +88,96 @@ $(document).ready(function(){
     })
 
     // decrease cart
-    $('.decrease_cart').on('click', function(e){
+    $(document).on('click', '.decrease_cart', function(e){
         e.preventDefault();
-        
-        product_id = $(this).attr('data-id');
-        url = $(this).attr('data-url');
-        cart_id = $(this).attr('id');
-        
+        queueCartDelta($(this).attr('data-id'), -1);
+    })
+
+
+    // Infinite scroll of the home catalog, the next cards come as an HTML fragment
+    var catalogLoading = false;
+
+    function loadMoreCatalog(){
+        var catalog = $('#catalog');
+        var cursor = catalog.attr('data-cursor');
+        if(catalogLoading || !cursor){
+            return;
+        }
+        catalogLoading = true;
 
         $.ajax({
             type: 'GET',
-            url: url,
+            url: catalog.attr('data-url'),
+            data: {'cursor': cursor},
+            success: function(response, status, xhr){
+                catalog.append(response);
+                catalog.attr('data-cursor', xhr.getResponseHeader('X-Next-Cursor') || '');
+                if(!catalog.attr('data-cursor')){
+                    $('#catalog-more').remove();
+                }
+            },
+            complete: function(){
+                catalogLoading = false;
+            }
+        })
+    }
+
+    if($('#catalog').length){
+        $('#catalog-more a').on('click', function(e){
+            e.preventDefault();
+            loadMoreCatalog();
+        })
+        $(window).on('scroll', function(){
+            if($(window).scrollTop() + $(window).height() > $(document).height() - 600){
+                loadMoreCatalog();
+            }
+        })
+    }
+
+
+    // Rapid +/- clicks are coalesced per product and sent as one batched update
+    var pendingCartDeltas = {};
+    var cartFlushTimer = null;
+
+    function queueCartDelta(product_id, delta){
+        pendingCartDeltas[product_id] = (pendingCartDeltas[product_id] || 0) + delta;
+
+        // show the expected quantity right away, the response confirms it
+        var qty = parseInt($('#qty-'+product_id).html()) || 0;
+        $('#qty-'+product_id).html(Math.max(qty + delta, 0));
+
+        clearTimeout(cartFlushTimer);
+        cartFlushTimer = setTimeout(flushCartDeltas, 300);
+    }
+
+    function flushCartDeltas(){
+        var operations = [];
+        for(product_id in pendingCartDeltas){
+            if(pendingCartDeltas[product_id] != 0){
+                operations.push({'product_id': product_id, 'delta': pendingCartDeltas[product_id]});
+            }
+        }
+        pendingCartDeltas = {};
+        if(operations.length == 0){
+            return;
+        }
+
+        $.ajax({
+            type: 'POST',
+            url: '/marketplace/update_cart/',
+            contentType: 'application/json',
+            data: JSON.stringify({'operations': operations}),
+            headers: {'X-CSRFToken': getCookie('csrftoken')},
             success: function(response){
                 console.log(response)
                 if(response.status == 'login_required'){
                     swal(response.message, '', 'info').then(function(){
-                        window.location = '/account/login';         
+                        window.location = '/account/login';
                     })
                 }else if(response.status == 'Failed'){
                     swal(response.message, '', 'error')
                 }else{
                     $('#cart_counter').html(response.cart_counter['cart_count']);
-                    $('#qty-'+product_id).html(response.qty);
 
                     applyCartAmounts(
                         response.cart_amount['subtotal'],
@@ -145,15 +185,32 @@ $(document).ready(function(){
                         response.cart_amount['grand_total']
                     )
 
+                    for(product_id in response.quantities){
+                        var qty = response.quantities[product_id];
+                        $('#qty-'+product_id).html(qty);
+
+                        if(window.location.pathname == '/cart/'){
+                            removeCartItem(qty, $('.decrease_cart[data-id='+product_id+']').attr('id'));
+                        }
+                    }
                     if(window.location.pathname == '/cart/'){
-                        removeCartItem(response.qty, cart_id);
                         checkEmptyCart();
                     }
-                    
-                } 
+                }
             }
         })
-    })
+    }
+
+    function getCookie(name){
+        var cookies = document.cookie ? document.cookie.split(';') : [];
+        for(var i = 0; i < cookies.length; i++){
+            var cookie = cookies[i].trim();
+            if(cookie.substring(0, name.length + 1) == (name + '=')){
+                return decodeURIComponent(cookie.substring(name.length + 1));
+            }
+        }
+        return null;
+    }
 
 
     // DELETE CART ITEM
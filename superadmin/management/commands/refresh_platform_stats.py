@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from superadmin.models import PlatformStats
+
+
+class Command(BaseCommand):
+    help = 'Recount the admin dashboard statistics, e.g. from cron, so no page view has to'
+
+    def handle(self, *args, **options):
+        stats = PlatformStats.objects.refresh()
+        self.stdout.write(self.style.SUCCESS('Counted %d orders, %d customers, %d vendors, %d products' % (
+            stats.orders, stats.customers, stats.vendors, stats.products)))
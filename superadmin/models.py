@@ -1,3 +1,76 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.models import User
+from orders.models import Order, VendorDailyRevenue
+from products.models import Product
+from vendor.models import Vendor
+
+
+class PlatformStatsManager(models.Manager):
+    SNAPSHOT_ID = 1
+
+    def refresh(self):
+        """Recount everything into the snapshot row and return it."""
+        # Paid orders per vendor come from the daily revenue rollups, not from the orders
+        vendor_orders = list(
+            VendorDailyRevenue.objects.values('vendor__shop_name', 'vendor__user__email', 'vendor__slug')
+            .annotate(count=Sum('orders_count')).order_by('-count', 'vendor__shop_name'))
+        stats, created = self.update_or_create(id=self.SNAPSHOT_ID, defaults={
+            'orders': Order.objects.filter(is_ordered=True).count(),
+            'customers': User.objects.filter(role=User.CUSTOMER, is_active=True).count(),
+            'vendors': Vendor.objects.filter(is_approved=True).count(),
+            'products': Product.objects.filter(is_available=True).count(),
+            'vendor_orders': [{
+                'shop_name': row['vendor__shop_name'],
+                'email': row['vendor__user__email'],
+                'slug': row['vendor__slug'],
+                'count': row['count'],
+            } for row in vendor_orders],
+            'refreshed_at': timezone.now(),
+        })
+        return stats
+
+    def snapshot(self):
+        """The snapshot row, refreshed first when older than PLATFORM_STATS_MAX_AGE seconds.
+
+        Only one process refreshes a stale snapshot at a time: the conditional
+        UPDATE claiming it only matches the refreshed_at it read, and the
+        others read the stale row meanwhile.
+        """
+        stats = self.filter(id=self.SNAPSHOT_ID).first()
+        if stats is None:
+            return self.refresh()
+        if stats.refreshed_at > timezone.now() - timedelta(seconds=settings.PLATFORM_STATS_MAX_AGE):
+            return stats
+        if not self.filter(id=self.SNAPSHOT_ID, refreshed_at=stats.refreshed_at).update(refreshed_at=timezone.now()):
+            return stats
+        try:
+            return self.refresh()
+        except Exception:
+            # Stale again, so the next request retries
+            self.filter(id=self.SNAPSHOT_ID).update(refreshed_at=stats.refreshed_at)
+            raise
+
+
+class PlatformStats(models.Model):
+    """Counters of the admin dashboard, a single row recomputed by PlatformStats.objects.refresh()."""
+    orders = models.PositiveIntegerField(default=0)
+    customers = models.PositiveIntegerField(default=0)
+    vendors = models.PositiveIntegerField(default=0)
+    products = models.PositiveIntegerField(default=0)
+    # [{'shop_name', 'email', 'slug', 'count'}] paid orders per vendor, most orders first
+    vendor_orders = models.JSONField(default=list)
+    refreshed_at = models.DateTimeField()
+
+    objects = PlatformStatsManager()
+
+    class Meta:
+        verbose_name_plural = 'platform stats'
 
-# Create your models here.
+    def __str__(self):
+        return 'Platform stats of %s' % self.refreshed_at
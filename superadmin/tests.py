@@ -1,3 +1,114 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User, UserProfile
+from orders.models import Order, VendorDailyRevenue
+from products.models import Category, Product
+from vendor.models import Vendor
+
+from .models import PlatformStats
+
+
+class PlatformStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_superuser(email='admin@test.com', password='abc@test', first_name='A', last_name='A')
+        admin.role = User.ADMIN
+        admin.save()
+        customer = User.objects.create_user(email='customer@test.com', password='abc@test', first_name='C', last_name='C')
+        customer.role = User.CUSTOMER
+        customer.is_active = True
+        customer.save()
+        self.vendors = []
+        for shop in ('ShopA', 'ShopB'):
+            user = User.objects.create_user(
+                email='%s@test.com' % shop, password='abc@test', first_name=shop, last_name=shop)
+            self.vendors.append(Vendor.objects.create(
+                user=user, user_profile=UserProfile.objects.get(user=user), shop_name=shop, slug=shop.lower(),
+                is_approved=True))
+        self.category = Category.objects.create(vendor=self.vendors[0], category_name='Bag', slug='bag')
+        self.add_product('bag-1')
+        Order.objects.create(user=customer, first_name='C', last_name='C', email='customer@test.com',
+                             address='a', city='pune', pin_code='443302', total=10.5, payment_method='COD',
+                             is_ordered=True)
+        today = timezone.localdate()
+        VendorDailyRevenue.objects.create(vendor=self.vendors[0], date=today, revenue=Decimal('10.50'), orders_count=1)
+        VendorDailyRevenue.objects.create(vendor=self.vendors[1], date=today, revenue=Decimal('42.00'), orders_count=3)
+        VendorDailyRevenue.objects.create(
+            vendor=self.vendors[1], date=today - datetime.timedelta(days=1), revenue=Decimal('7.00'), orders_count=1)
+        self.client.login(email='admin@test.com', password='abc@test')
+
+    def add_product(self, slug):
+        Product.objects.create(vendor=self.vendors[0], category=self.category, title=slug, slug=slug,
+                               price='10.50', image='productimages/casual.jpeg')
+
+    def test_dashboard_reads_one_precomputed_row(self):
+        response = self.client.get(reverse('admindashboard'))
+        self.assertEqual([response.context[key] for key in ('totalOrders', 'totalCustomers', 'totalVendors',
+                                                            'totalProducts')], [1, 1, 2, 1])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admindashboard'))
+        self.assertEqual(response.context['totalProducts'], 1)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        self.assertEqual(response.context['stats_refreshed_at'], PlatformStats.objects.get().refreshed_at)
+
+    def test_stale_or_forced_refresh_recounts(self):
+        self.client.get(reverse('admindashboard'))
+        self.add_product('bag-2')
+        self.assertEqual(self.client.get(reverse('admindashboard')).context['totalProducts'], 1)
+
+        response = self.client.post(reverse('admin_refresh_stats'), {'next': reverse('admin_orders_detail')})
+        self.assertRedirects(response, reverse('admin_orders_detail'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('admindashboard')).context['totalProducts'], 2)
+        response = self.client.post(reverse('admin_refresh_stats'), {'next': 'https://example.com/'})
+        self.assertRedirects(response, reverse('admindashboard'), fetch_redirect_response=False)
+
+        self.add_product('bag-3')
+        PlatformStats.objects.update(refreshed_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(self.client.get(reverse('admindashboard')).context['totalProducts'], 3)
+
+    def test_only_one_process_refreshes_a_stale_snapshot(self):
+        PlatformStats.objects.refresh()
+        stale = timezone.now() - datetime.timedelta(hours=1)
+        PlatformStats.objects.update(refreshed_at=stale)
+        self.add_product('bag-2')
+        refresh = PlatformStats.objects.refresh
+        seen = []
+
+        def refresh_while_another_request_arrives():
+            seen.append(PlatformStats.objects.snapshot().products)
+            return refresh()
+        with patch.object(PlatformStats.objects, 'refresh', side_effect=refresh_while_another_request_arrives) as mock:
+            stats = PlatformStats.objects.snapshot()
+        # The second request found the snapshot claimed and read the stale counts
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(seen, [1])
+        self.assertEqual(stats.products, 2)
+
+        PlatformStats.objects.update(refreshed_at=stale)
+        with patch.object(PlatformStats.objects, 'refresh', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                PlatformStats.objects.snapshot()
+        self.assertEqual(PlatformStats.objects.get().refreshed_at, stale)
+
+    def test_orders_per_vendor_come_from_the_rollups(self):
+        response = self.client.get(reverse('admin_orders_detail'))
+        self.assertEqual([(row['shop_name'], row['count']) for row in response.context['vendor_orders']],
+                         [('ShopB', 4), ('ShopA', 1)])
+        self.assertContains(response, reverse('admin_vendor_order_detail', args=['shopb']))
 
-# Create your tests here.
+    def test_refresh_command(self):
+        out = StringIO()
+        call_command('refresh_platform_stats', stdout=out)
+        self.assertIn('Counted 1 orders, 1 customers, 2 vendors, 1 products', out.getvalue())
+        self.assertEqual(PlatformStats.objects.count(), 1)
@@ -12,6 +12,10 @@ urlpatterns = [
     path('order_detail/<int:order_number>', views.admin_customer_order_detail, name='admin_customer_order_detail'),
 
     path('customers/', views.customers, name='admin_customers'),
+    path('cache_stats/', views.admin_cache_stats, name='admin_cache_stats'),
+    path('throttle_stats/', views.admin_throttle_stats, name='admin_throttle_stats'),
+    path('refresh_stats/', views.admin_refresh_stats, name='admin_refresh_stats'),
+    path('export/<str:kind>/', views.admin_export_orders, name='admin_export_orders'),
     
 
 ]
\ No newline at end of file
@@ -1,11 +1,20 @@
-from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib import messages
+from django.http import JsonResponse
 from django.shortcuts import render,get_object_or_404,redirect
+from django.utils.http import url_has_allowed_host_and_scheme
 from vendor.models import  Vendor
 from accounts.models import User
 from products.models import Category,Product
-from orders.models import Order,OrderedProduct
+from orders.models import Order,OrderedProduct,VendorOrder
 from django.db.models import Prefetch
-from django.db.models import Count
+from accounts.throttling import throttle_stats
+from ecart.cache import cache_stats, cached
+from ecart.pagination import keyset_paginate
+from orders.views import stream_export
+from accounts.views import check_role_admin
+from .models import PlatformStats
 
 # Create your views here.
 @login_required(login_url='login')
@@ -23,12 +32,14 @@ def vendors(request):
 
 def vendor_detail(request, vendor_slug):
     vendor = get_object_or_404(Vendor, slug=vendor_slug)
-    categories = Category.objects.filter(vendor=vendor).prefetch_related(
-        Prefetch(
-            'products',
-            queryset = Product.objects.filter(is_available=True)
+    categories = cached('storefront:%s' % vendor.id, lambda: list(
+        Category.objects.filter(vendor=vendor).prefetch_related(
+            Prefetch(
+                'products',
+                queryset = Product.objects.filter(is_available=True)
+            )
         )
-    )
+    ), ['vendor:%s' % vendor.id])
     context = {
         'vendor': vendor,
         'categories': categories,
@@ -37,10 +48,10 @@ def vendor_detail(request, vendor_slug):
 
 
 def admin_orders_detail(request):
-    
-    orders = (Order.objects.values('vendors__shop_name','vendors__user__email','vendors__slug').annotate(count=Count('order_number')).order_by())
+    stats = PlatformStats.objects.snapshot()
     context = {
-        'orders': orders,
+        'vendor_orders': stats.vendor_orders,
+        'stats_refreshed_at': stats.refreshed_at,
     }
     
     return render(request,'superadmin/order_details.html',context)
@@ -49,11 +60,14 @@ def admin_orders_detail(request):
 def admin_vendor_order_detail(request, vendor_slug):
     vendor = get_object_or_404(Vendor, slug=vendor_slug)
     
-    orders = Order.objects.filter(
-        vendors__in=[vendor.id], is_ordered=True).order_by('created_at')
-    
+    # VendorOrder is indexed on (vendor, created_at, id), unlike the Order.vendors join
+    vendor_orders = VendorOrder.objects.filter(vendor=vendor, order__is_ordered=True).select_related('order')
+    page = keyset_paginate(vendor_orders, request.GET.get('cursor'), settings.ORDER_HISTORY_PAGE_SIZE)
+
     context={
-        'orders':orders
+        'vendor_orders': page.items,
+        'page': page,
+        'vendor_slug': vendor.slug,
     }
     return render(request , 'superadmin/vendor_order_details.html',context)
 
@@ -86,3 +100,40 @@ def customers(request):
         'customers': allCustomer,
     }
     return render(request, 'superadmin/customers.html', context)
+
+
+@login_required(login_url='login')
+@user_passes_test(check_role_admin)
+def admin_cache_stats(request):
+    # Hit/miss counters of the cached catalog reads, per namespace
+    return JsonResponse(cache_stats())
+
+
+@login_required(login_url='login')
+@user_passes_test(check_role_admin)
+def admin_refresh_stats(request):
+    # Recount the dashboard counters now instead of waiting for PLATFORM_STATS_MAX_AGE
+    if request.method == 'POST':
+        PlatformStats.objects.refresh()
+        messages.success(request, 'Statistics refreshed')
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('admindashboard')
+
+
+@login_required(login_url='login')
+@user_passes_test(check_role_admin)
+def admin_throttle_stats(request):
+    # Requests let through and rejected by the login and password reset limiters
+    return JsonResponse(throttle_stats())
+
+
+@login_required(login_url='login')
+@user_passes_test(check_role_admin)
+def admin_export_orders(request, kind):
+    # Same filters as the vendor export, plus ?vendor=<slug> to limit it to one shop
+    vendor = None
+    if request.GET.get('vendor'):
+        vendor = get_object_or_404(Vendor, slug=request.GET['vendor'])
+    return stream_export(request, kind, vendor)